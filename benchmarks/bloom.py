@@ -0,0 +1,48 @@
+"""
+Measure the user filter: its size, its false positive rate and the cost
+of a lookup compared to the uniqueness query it saves.
+
+    $ python benchmarks/bloom.py --capacity 100000 --error-rate 0.01
+
+"""
+import argparse
+
+import common
+
+from django.contrib.auth import get_user_model
+
+from registration_api.bloom import BloomFilter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--capacity', type=int, default=100000)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    bloom_filter = BloomFilter(args.capacity, args.error_rate)
+    for i in range(args.capacity):
+        bloom_filter.add(u'username:user%d' % i)
+    false_positives = sum(1 for i in range(args.lookups)
+                          if u'username:free%d' % i in bloom_filter)
+
+    common.setup_database()
+    user_model = get_user_model()
+    filter_timings = common.timeit(
+        lambda i: u'username:free%d' % i in bloom_filter, args.lookups)
+    query_timings = common.timeit(
+        lambda i: user_model.objects.filter(username='free%d' % i).exists(),
+        args.lookups)
+    common.dump({
+        'bytes': len(bloom_filter.bits),
+        'hashes': bloom_filter.hashes,
+        'false_positive_rate': float(false_positives) / args.lookups,
+        'lookup': common.percentiles(filter_timings),
+        'query': common.percentiles(query_timings),
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
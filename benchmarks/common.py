@@ -0,0 +1,65 @@
+"""
+Helpers shared by the benchmark scripts. They run against the test
+settings in ``tests/settings.py``, like ``tests/runtests.py``.
+
+"""
+import json
+import os
+import re
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'tests'))
+sys.path.insert(0, BASE_DIR)
+os.environ['DJANGO_SETTINGS_MODULE'] = 'settings'
+
+
+# Transaction control statements, as logged by the database backends
+# (sqlite logs ``QUERY = u'BEGIN' - PARAMS = ()``).
+TRANSACTION_STATEMENT_RE = re.compile(
+    r"^(QUERY = u?')?(BEGIN|SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b")
+
+
+def count_queries(captured_queries):
+    """Count the queries in ``captured_queries``, leaving out transaction control."""
+    return len([q for q in captured_queries
+                if not TRANSACTION_STATEMENT_RE.search(q['sql'])])
+
+
+def setup_database():
+    """Create the test database (in-memory sqlite) and return its name."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    return connection.creation.create_test_db(verbosity=0)
+
+
+def percentiles(timings, points=(50, 90, 99)):
+    """Return the given percentiles of ``timings``, in milliseconds."""
+    timings = sorted(timings)
+    result = {}
+    for point in points:
+        index = min(len(timings) - 1, int(len(timings) * point / 100.0))
+        result['p%d' % point] = round(timings[index] * 1000, 3)
+    return result
+
+
+def timeit(func, repeat):
+    """Call ``func`` ``repeat`` times and return the duration of each call."""
+    timings = []
+    for i in range(repeat):
+        start = time.time()
+        func(i)
+        timings.append(time.time() - start)
+    return timings
+
+
+def dump(results, output=None):
+    data = json.dumps(results, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'w') as f:
+            f.write(data + '\n')
+    else:
+        sys.stdout.write(data + '\n')
@@ -0,0 +1,80 @@
+"""
+Measure how long importing the registration_api modules takes in a
+fresh interpreter, as a worker does when it boots, and how many times
+each import loads the user model.
+
+    $ python benchmarks/import_time.py --repeat 20 --budget-ms 200
+
+Exits with an error when an import queries the database or its median
+time is over ``--budget-ms``.
+
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+import common
+
+
+MODULES = ['registration_api', 'registration_api.models',
+           'registration_api.utils', 'registration_api.views']
+
+# Run in a fresh interpreter for each measure: Django is set up (as it
+# is before the project's modules are imported), then ``module`` is.
+SCRIPT = """
+import json, sys, time
+sys.path[:0] = %(path)r
+import django
+if hasattr(django, 'setup'):
+    django.setup()
+from django.conf import settings
+settings.DEBUG = True
+import django.contrib.auth
+from django.db import connection
+calls = []
+get_user_model = django.contrib.auth.get_user_model
+def counting_get_user_model():
+    calls.append(1)
+    return get_user_model()
+django.contrib.auth.get_user_model = counting_get_user_model
+start = time.time()
+__import__(%(module)r)
+print(json.dumps({'seconds': time.time() - start,
+                  'queries': len(connection.queries),
+                  'get_user_model': len(calls)}))
+"""
+
+
+def measure(module):
+    script = SCRIPT % {'path': sys.path[:2], 'module': module}
+    output = subprocess.check_output([sys.executable, '-c', script])
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {}
+    failed = False
+    for module in args.modules:
+        runs = [measure(module) for i in range(args.repeat)]
+        result = common.percentiles([run['seconds'] for run in runs])
+        result['queries'] = max(run['queries'] for run in runs)
+        result['get_user_model'] = max(run['get_user_model'] for run in runs)
+        result['over_budget'] = (args.budget_ms is not None and
+                                 result['p50'] > args.budget_ms)
+        failed = failed or result['queries'] or result['over_budget']
+        results[module] = result
+    common.dump(results, args.output)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
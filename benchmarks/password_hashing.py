@@ -0,0 +1,57 @@
+"""
+Compare the throughput of ``utils.hash_password`` hashing in the
+calling thread and on thread and process pools of several sizes, while
+``--clients`` threads (a threaded server's request threads) hash
+concurrently.
+
+    $ python benchmarks/password_hashing.py --workers 1 2 4 8
+
+"""
+import argparse
+import threading
+import time
+
+import common
+
+from django.test.utils import override_settings
+
+from registration_api import utils
+
+
+def run(clients, passwords):
+    def client():
+        for i in range(passwords):
+            utils.hash_password('verylongpassword%d' % i)
+
+    threads = [threading.Thread(target=client) for i in range(clients)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+    return {'seconds': round(elapsed, 3),
+            'passwords_per_second': round(clients * passwords / elapsed, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--passwords', type=int, default=5,
+                        help='Passwords hashed by each client.')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {'inline': run(args.clients, args.passwords)}
+    for kind in sorted(utils.PASSWORD_HASHING_POOLS):
+        for workers in args.workers:
+            with override_settings(REGISTRATION_API_PASSWORD_HASHING_POOL=kind,
+                                   REGISTRATION_API_PASSWORD_HASHING_WORKERS=workers):
+                results['%s-%d' % (kind, workers)] = run(args.clients,
+                                                         args.passwords)
+    common.dump(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
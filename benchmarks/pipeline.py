@@ -0,0 +1,147 @@
+"""
+Benchmark the registration pipeline against a local sqlite database:
+the ``register`` view, ``utils.create_inactive_user``,
+``utils.activate_user`` and ``utils.send_activation_email``.
+
+Every operation is run ``--iterations`` times for each user table size
+in ``--sizes``. Latency percentiles, throughput and the number of
+queries per operation are printed as JSON. The script exits with status
+1 when an operation runs more queries than its budget in
+``--budgets`` (``benchmarks/budgets.json`` by default).
+
+    $ python benchmarks/pipeline.py --sizes 0 1000 10000 --output bench.json
+
+"""
+import argparse
+import json
+import os
+import sys
+
+import common
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from registration_api import utils, views
+
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'budgets.json')
+
+
+def seed_users(size):
+    """Grow the user table to ``size`` rows."""
+    user_model = get_user_model()
+    missing = size - user_model.objects.count()
+    if missing > 0:
+        start = user_model.objects.count()
+        user_model.objects.bulk_create(
+            [user_model(**{user_model.USERNAME_FIELD: 'seed%d' % i,
+                           'email': 'seed%d@example.com' % i,
+                           'password': '!'})
+             for i in range(start, start + missing)], batch_size=500)
+
+
+def measure(func, iterations):
+    """
+    Run ``func(i)`` ``iterations`` times, returning the latency
+    percentiles, throughput and the largest number of queries (not
+    counting transaction control) run by one call.
+
+    """
+    queries = []
+
+    def call(i):
+        with CaptureQueriesContext(connection) as captured:
+            func(i)
+        queries.append(common.count_queries(captured.captured_queries))
+
+    timings = common.timeit(call, iterations)
+    result = common.percentiles(timings)
+    result['ops_per_second'] = round(len(timings) / sum(timings), 1)
+    result['queries'] = max(queries)
+    return result
+
+
+def run(size, iterations):
+    seed_users(size)
+    site = Site.objects.get_current()
+    factory = RequestFactory()
+    prefix = 'bench%d-' % size
+
+    def register(i):
+        request = factory.post('/register/', {
+            'username': '%sview%d' % (prefix, i),
+            'email': 'view%d@example.com' % i,
+            'password': 'verylongpassword'})
+        response = views.register(request)
+        assert response.status_code == 201, response.data
+
+    users = []
+
+    def create_inactive_user(i):
+        users.append(utils.create_inactive_user(
+            '%sutils%d' % (prefix, i), 'utils%d@example.com' % i,
+            'verylongpassword'))
+
+    def send_activation_email(i):
+        utils.send_activation_email(users[i], site)
+
+    def activate_user(i):
+        assert utils.activate_user(users[i].api_registration_profile.activation_key)
+
+    return {
+        'register': measure(register, iterations),
+        'create_inactive_user': measure(create_inactive_user, iterations),
+        'send_activation_email': measure(send_activation_email, iterations),
+        'activate_user': measure(activate_user, iterations),
+    }
+
+
+def check_budgets(results, budgets):
+    """Return a list describing every operation over its query budget."""
+    failures = []
+    for size, operations in sorted(results.items()):
+        for name, result in sorted(operations.items()):
+            if name in budgets and result['queries'] > budgets[name]:
+                failures.append('%s ran %d queries with %s users (budget %d)' % (
+                    name, result['queries'], size, budgets[name]))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1000, 10000],
+                        help='User table sizes to run the benchmark at.')
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--budgets', default=DEFAULT_BUDGETS,
+                        help='JSON file of query budgets per operation.')
+    parser.add_argument('--fast-hasher', action='store_true',
+                        help='Hash passwords with MD5 to measure everything else.')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    common.setup_database()
+    with open(args.budgets) as f:
+        budgets = json.load(f)
+
+    overrides = {'REGISTRATION_API_THROTTLE_RATES': {}}
+    if args.fast_hasher:
+        overrides['PASSWORD_HASHERS'] = ('django.contrib.auth.hashers.MD5PasswordHasher', )
+    results = {}
+    with override_settings(**overrides):
+        for size in sorted(args.sizes):
+            results[str(size)] = run(size, args.iterations)
+
+    failures = check_budgets(results, budgets)
+    common.dump({'results': results, 'budgets': budgets,
+                 'over_budget': failures}, args.output)
+    if failures:
+        sys.stderr.write('\n'.join(failures) + '\n')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
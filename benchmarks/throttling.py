@@ -0,0 +1,48 @@
+"""
+Measure the cost of the registration throttle checks against Django's
+local memory cache (or the cache configured with ``--cache``).
+
+    $ python benchmarks/throttling.py --checks 10000
+
+"""
+import argparse
+
+import common
+
+from django.core.cache import get_cache
+
+from registration_api.throttling import RegisterEmailThrottle, RegisterIPThrottle
+
+
+class Request(object):
+
+    def __init__(self, i):
+        self.META = {'REMOTE_ADDR': '10.0.%d.%d' % (i // 256 % 256, i % 256)}
+        self.DATA = {'email': 'user%d@example.com' % i}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--checks', type=int, default=10000)
+    parser.add_argument('--cache', default='django.core.cache.backends.locmem.LocMemCache')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    requests = [Request(i) for i in range(args.checks)]
+    cache = get_cache(args.cache)
+    results = {}
+    for throttle_class in (RegisterIPThrottle, RegisterEmailThrottle):
+        throttle_class.cache = cache
+
+        def check(i):
+            throttle_class().allow_request(requests[i], None)
+
+        timings = common.timeit(check, args.checks)
+        result = common.percentiles(timings)
+        result['mean_us'] = round(sum(timings) / len(timings) * 1e6, 2)
+        results[throttle_class.__name__] = result
+    common.dump(results, args.output)
+
+
+if __name__ == '__main__':
+    main()
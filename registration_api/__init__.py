@@ -6,3 +6,5 @@ def get_version():
     return '.'.join(str(i) for i in version)
 
 __version__ = get_version()
+
+default_app_config = 'registration_api.apps.RegistrationApiConfig'
@@ -0,0 +1,31 @@
+from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.utils.translation import ugettext_lazy as _
+
+from .export import CONTENT_TYPES, export_registrations
+from .models import RegistrationProfile
+
+
+def streaming_export(format):
+    def action(modeladmin, request, queryset):
+        response = StreamingHttpResponse(export_registrations(queryset, format),
+                                         content_type=CONTENT_TYPES[format])
+        response['Content-Disposition'] = 'attachment; filename="registrations.%s"' % format
+        return response
+    action.__name__ = 'export_%s' % format
+    action.short_description = _('Export selected registrations as %s') % format.upper()
+    return action
+
+
+export_csv = streaming_export('csv')
+export_jsonl = streaming_export('jsonl')
+
+
+class RegistrationProfileAdmin(admin.ModelAdmin):
+    list_display = ('user', 'state', 'expires_at')
+    list_filter = ('state', )
+    raw_id_fields = ('user', )
+    actions = [export_csv, export_jsonl]
+
+
+admin.site.register(RegistrationProfile, RegistrationProfileAdmin)
@@ -0,0 +1,128 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from django.utils import six
+
+
+PREFIX = 'REGISTRATION_API_'
+
+# (name, default, expected types or list of allowed values). A default
+# of ``None`` makes the setting mandatory.
+SETTINGS = (
+    ('ACCOUNT_ACTIVATION_DAYS', 7, six.integer_types),
+    ('ACTIVATION_SUCCESS_URL', None, six.string_types),
+    ('ACTIVATION_KEY_MODE', 'sha1', ['sha1', 'signed']),
+    ('ACTIVATION_KEY_GENERATOR', 'registration_api.keys.RandomKeyGenerator',
+     six.string_types),
+    ('COMPACT_ACTIVATION_KEYS', False, bool),
+    ('DEFER_USER_CREATION', False, bool),
+    ('ACTIVATION_FAILURE_CACHE_TTL', 0, six.integer_types),
+    ('USE_EMAIL_OUTBOX', False, bool),
+    ('EMAIL_OUTBOX_MAX_ATTEMPTS', 5, six.integer_types),
+    ('EMAIL_OUTBOX_RETRY_DELAY', 60, six.integer_types + (float, )),
+    ('PASSWORD_HASHING_POOL', False, [False, 'thread', 'process']),
+    ('PASSWORD_HASHING_WORKERS', 4, six.integer_types),
+    ('THROTTLE_RATES', {'register_ip': '20/hour',
+                        'register_email': '5/hour',
+                        'activate_ip': '60/min'}, dict),
+    ('THROTTLE_PROXY_COUNT', 0, six.integer_types),
+    ('THROTTLE_IP_HEADER', 'HTTP_X_FORWARDED_FOR', six.string_types),
+    ('METRICS_SINKS', (), (list, tuple)),
+    ('STATSD_HOST', 'localhost', six.string_types),
+    ('STATSD_PORT', 8125, six.integer_types),
+    ('STATSD_PREFIX', 'registration_api', six.string_types),
+    ('USER_FILTER', False, (bool, dict)),
+    ('IDEMPOTENCY_TTL', 24 * 60 * 60, six.integer_types),
+    ('IDEMPOTENCY_WAIT', 5, six.integer_types + (float, )),
+    ('TRACK_STATS', False, bool),
+    ('DATABASE', 'default', six.string_types),
+    ('READ_DATABASE', '', six.string_types),
+    ('PROFILE_SAMPLE_RATE', 0, six.integer_types + (float, )),
+    ('PROFILE_SLOW_THRESHOLD', 0, six.integer_types + (float, )),
+    ('PROFILE_INTERVAL', 0.005, six.integer_types + (float, )),
+    ('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'registration_api_profiles'),
+     six.string_types),
+    ('PROFILE_KEEP', 100, six.integer_types),
+)
+DEFAULTS = dict((name, default) for name, default, expected in SETTINGS)
+
+# Lowest value allowed for numeric settings.
+MINIMUMS = {
+    'PROFILE_KEEP': 1,
+}
+
+
+class RegistrationSettings(object):
+    """
+    The ``REGISTRATION_API_*`` settings, read from ``django.conf.settings``
+    on first use and read again whenever one of them changes. Settings
+    are attributes named without the prefix, for example
+    ``app_settings.ACCOUNT_ACTIVATION_DAYS``.
+
+    """
+    def __init__(self):
+        self._values = None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._values is None:
+            self.reload()
+        try:
+            return self._values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def reload(self):
+        self._values = dict(
+            (name, getattr(settings, PREFIX + name, default))
+            for name, default, expected in SETTINGS)
+
+    def get(self, name):
+        """
+        Return the value of the setting ``name`` (with or without the
+        prefix), raising ``ImproperlyConfigured`` if it is empty.
+
+        """
+        if name.startswith(PREFIX):
+            name = name[len(PREFIX):]
+        value = getattr(self, name)
+        if value is None:
+            raise ImproperlyConfigured(
+                "The %s%s setting must not be empty." % (PREFIX, name))
+        return value
+
+    def validate(self):
+        """
+        Check every setting, raising ``ImproperlyConfigured`` for the
+        first one that is missing or has an invalid value.
+
+        """
+        for name, default, expected in SETTINGS:
+            value = self.get(name)
+            if isinstance(expected, list):
+                if value not in expected:
+                    raise ImproperlyConfigured(
+                        "The %s%s setting must be one of %s." % (
+                            PREFIX, name, ', '.join(repr(v) for v in expected)))
+            elif not isinstance(value, expected):
+                raise ImproperlyConfigured(
+                    "The %s%s setting has an invalid value: %r." % (
+                        PREFIX, name, value))
+            elif name in MINIMUMS and value < MINIMUMS[name]:
+                raise ImproperlyConfigured(
+                    "The %s%s setting must be at least %r." % (
+                        PREFIX, name, MINIMUMS[name]))
+
+
+app_settings = RegistrationSettings()
+
+
+@receiver(setting_changed)
+def reload_settings(**kwargs):
+    if kwargs['setting'].startswith(PREFIX):
+        app_settings.reload()
@@ -0,0 +1,33 @@
+from django.db.models.signals import post_save
+
+try:
+    from django.apps import AppConfig
+except ImportError:
+    # Django < 1.7, ``setup`` runs when the models are loaded.
+    AppConfig = object
+
+from . import bloom
+from .app_settings import app_settings
+
+
+HAS_APP_REGISTRY = AppConfig is not object
+
+
+def setup():
+    """
+    Check the settings, so a misconfiguration is reported when the
+    project starts, and connect the signal handlers. Runs once, after
+    the models are loaded, and touches neither the database nor the
+    user model.
+
+    """
+    app_settings.validate()
+    post_save.connect(bloom.user_saved, dispatch_uid='registration_api.bloom.user_saved')
+
+
+class RegistrationApiConfig(AppConfig):
+    name = 'registration_api'
+    verbose_name = 'Registration API'
+
+    def ready(self):
+        setup()
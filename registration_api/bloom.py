@@ -0,0 +1,175 @@
+import hashlib
+import math
+import struct
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+
+from .app_settings import app_settings
+from .user_fields import get_registration_fields
+
+
+CACHE_KEY = 'registration_api:user_filter'
+# Seconds between two looks in the cache for a filter that was not warmed.
+RETRY_INTERVAL = 60
+
+
+class BloomFilter(object):
+    """
+    A Bloom filter sized for ``capacity`` values with a false positive
+    rate of ``error_rate``. ``value in bloom_filter`` is ``False`` only
+    for values that were never added.
+
+    """
+    def __init__(self, capacity, error_rate, bits=None):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, int(round(self.size / float(capacity) * math.log(2))))
+        if bits is None:
+            bits = bytearray((self.size + 7) // 8)
+        self.bits = bytearray(bits)
+
+    def _positions(self, value):
+        # Double hashing: the positions are h1 + i * h2.
+        h1, h2 = struct.unpack('<QQ', hashlib.md5(value.encode('utf-8')).digest())
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position // 8] |= 1 << (position % 8)
+
+    def __contains__(self, value):
+        for position in self._positions(value):
+            if not self.bits[position // 8] & 1 << (position % 8):
+                return False
+        return True
+
+
+class UserFilter(object):
+    """
+    A process-wide Bloom filter of the values taken in the unique
+    registration fields of the user model (see
+    ``user_fields.get_registration_fields``), configured by
+    ``REGISTRATION_API_USER_FILTER``.
+
+    The filter is loaded from the cache, where the
+    ``warm_registration_filter`` command stores it; until then every
+    value is looked up. It is never built in a request, that would scan
+    the whole user table. Users saved afterwards in this process are
+    added to it. Users created by other processes are not, so the unique
+    constraints of the user table remain the final check.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.bloom_filter = None
+        self.checked_at = None
+
+    def get(self):
+        """
+        Return the loaded ``BloomFilter``, or ``None`` when disabled or
+        not warmed yet.
+
+        """
+        config = app_settings.USER_FILTER
+        if not config:
+            self.bloom_filter = None
+            return None
+        if self.bloom_filter is None:
+            now = time.time()
+            if self.checked_at is not None and now - self.checked_at < RETRY_INTERVAL:
+                return None
+            with self._lock:
+                if self.bloom_filter is None:
+                    self.checked_at = now
+                    self.bloom_filter = self.load(config)
+        return self.bloom_filter
+
+    def get_params(self, config):
+        return (config.get('capacity', 1000000), config.get('error_rate', 0.01))
+
+    def load(self, config):
+        """
+        Return the filter stored in the cache, or ``None`` if there is
+        none for the current capacity and error rate.
+
+        """
+        stored = cache.get(CACHE_KEY)
+        if not stored or tuple(stored[:2]) != self.get_params(config):
+            return None
+        return self.new_filter(config, stored[2])
+
+    def new_filter(self, config, bits=None):
+        capacity, error_rate = self.get_params(config)
+        return BloomFilter(capacity, error_rate, bits)
+
+    def build(self):
+        """Return a new ``BloomFilter`` of all the users in the database."""
+        bloom_filter = self.new_filter(app_settings.USER_FILTER)
+        user_model = get_user_model()
+        names = [name for name, model_field in get_registration_fields(user_model)
+                 if model_field.unique]
+        rows = user_model._default_manager.values_list(*names).order_by()
+        for row in rows.iterator():
+            for name, value in zip(names, row):
+                bloom_filter.add(self.key(name, value))
+        return bloom_filter
+
+    def warm(self):
+        """
+        Build the filter and share it with other processes through the
+        cache, raising ``ValueError`` if the cache did not keep it (the
+        bits may exceed its item size limit).
+
+        """
+        bloom_filter = self.build()
+        config = app_settings.USER_FILTER
+        cache.set(CACHE_KEY, self.get_params(config) + (bytes(bloom_filter.bits), ), None)
+        if self.load(config) is None:
+            raise ValueError('The cache did not store the %d bytes of the filter.' %
+                             len(bloom_filter.bits))
+        self.bloom_filter = bloom_filter
+        return bloom_filter
+
+    def key(self, name, value):
+        return u'%s:%s' % (name, value)
+
+    def might_contain(self, name, value):
+        """
+        Return ``False`` if ``value`` is certainly not taken in the field
+        ``name``, ``True`` if it may be (or the filter is disabled).
+
+        """
+        bloom_filter = self.get()
+        return bloom_filter is None or self.key(name, value) in bloom_filter
+
+    def add_user(self, user):
+        """Add the values of ``user`` to the loaded filter, if any."""
+        if self.bloom_filter is None or not app_settings.USER_FILTER:
+            return
+        for name, model_field in get_registration_fields(type(user)):
+            if model_field.unique:
+                self.bloom_filter.add(self.key(name, getattr(user, name)))
+
+    def clear(self):
+        self.bloom_filter = None
+        self.checked_at = None
+
+
+user_filter = UserFilter()
+
+
+def user_saved(sender, instance, created, **kwargs):
+    if created and sender is get_user_model():
+        user_filter.add_user(instance)
+
+
+@receiver(setting_changed)
+def clear_user_filter(**kwargs):
+    if kwargs['setting'] == 'REGISTRATION_API_USER_FILTER':
+        user_filter.clear()
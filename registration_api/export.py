@@ -0,0 +1,115 @@
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.datastructures import SortedDict
+from django.utils.encoding import smart_str
+
+from .models import RegistrationProfile
+from .user_fields import get_registration_fields
+
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+# Untranslated, so exports read the same whatever the language.
+STATE_NAMES = {
+    RegistrationProfile.PENDING: 'pending',
+    RegistrationProfile.ACTIVE: 'activated',
+    RegistrationProfile.EXPIRED: 'expired',
+}
+
+
+def get_headers():
+    user_fields = get_registration_fields(get_user_model())
+    return (['id', 'user_id'] + [name for name, model_field in user_fields] +
+            ['state', 'expires_at'])
+
+
+def iter_chunks(queryset, lookups, chunk_size=1000):
+    """
+    Yield lists of at most ``chunk_size`` ``values_list(*lookups)`` rows
+    of ``queryset``. The first lookup must be the primary key.
+
+    Chunks are read by primary key ranges (``pk > last``) and through
+    ``iterator()``, so memory does not grow with the table and no
+    ``OFFSET`` is scanned over.
+
+    """
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        rows = list(chunk.values_list(*lookups)[:chunk_size].iterator())
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            break
+        last_pk = rows[-1][0]
+
+
+def get_user_values(user_ids, names):
+    """
+    Return the ``names`` values of the users ``user_ids``, by primary
+    key. Users are read on their own database rather than joined, the
+    registration tables may live on another one (see ``routers``).
+
+    """
+    user_model = get_user_model()
+    rows = user_model._default_manager.filter(pk__in=user_ids).values_list('pk', *names)
+    return dict((row[0], row[1:]) for row in rows)
+
+
+def iter_registrations(queryset, chunk_size=1000):
+    """Yield the exported fields of each profile of ``queryset``, in order."""
+    names = [name for name, model_field in get_registration_fields(get_user_model())]
+    missing = (None, ) * len(names)
+    lookups = ('pk', 'user_id', 'state', 'expires_at')
+    for rows in iter_chunks(queryset, lookups, chunk_size):
+        users = get_user_values([row[1] for row in rows], names)
+        for pk, user_id, state, expires_at in rows:
+            data = SortedDict([('id', pk), ('user_id', user_id)])
+            for name, value in zip(names, users.get(user_id, missing)):
+                data[name] = value
+            data['state'] = STATE_NAMES[state]
+            data['expires_at'] = expires_at
+            yield data
+
+
+class Echo(object):
+    """A file-like object returning what is written, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(queryset, chunk_size=1000):
+    headers = get_headers()
+    writer = csv.writer(Echo())
+    yield writer.writerow(headers)
+    for data in iter_registrations(queryset, chunk_size):
+        data['expires_at'] = data['expires_at'].isoformat()
+        yield writer.writerow([smart_str(data[header]) for header in headers])
+
+
+def export_jsonl(queryset, chunk_size=1000):
+    for data in iter_registrations(queryset, chunk_size):
+        yield json.dumps(data, cls=DjangoJSONEncoder) + '\n'
+
+
+EXPORTERS = {
+    'csv': export_csv,
+    'jsonl': export_jsonl,
+}
+
+
+def export_registrations(queryset, format='csv', chunk_size=1000):
+    """
+    Return a generator of the lines of ``queryset``, a queryset of
+    ``RegistrationProfile``, as CSV (with a header line) or JSON lines.
+
+    """
+    return EXPORTERS[format](queryset, chunk_size)
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+from .app_settings import app_settings
+
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+CACHE_FORMAT = 'registration_api:idempotency:%(scope)s:%(key)s'
+FINGERPRINT_SALT = 'registration_api.idempotency'
+# How long a request may hold its key before another one may take over.
+PENDING_TIMEOUT = 60
+POLL_INTERVAL = 0.05
+
+
+def get_fingerprint(request):
+    """
+    Return a digest of the request data, so a key reused for another
+    request is detected without storing the data (and its password).
+
+    """
+    data = request.DATA
+    if hasattr(data, 'getlist'):
+        data = dict((name, data.getlist(name)) for name in data)
+    return salted_hmac(FINGERPRINT_SALT, json.dumps(data, sort_keys=True)).hexdigest()
+
+
+def replay(entry, fingerprint):
+    if entry['fingerprint'] != fingerprint:
+        metrics.registry.incr('idempotency', 'mismatch')
+        return Response({'detail': 'Idempotency-Key reused with different data.'},
+                        status=422)
+    metrics.registry.incr('idempotency', 'replay')
+    response = Response(entry['data'], status=entry['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Decorator storing the response of a view in the cache for
+    ``REGISTRATION_API_IDEMPOTENCY_TTL`` seconds under the
+    ``Idempotency-Key`` header of the request. A retry with the same key
+    gets the stored response back instead of running the view again; a
+    retry arriving while the first request runs waits up to
+    ``REGISTRATION_API_IDEMPOTENCY_WAIT`` seconds for its response.
+
+    Server errors are not stored, the request can be retried.
+
+    """
+    def decorator(func):
+        @wraps(func)
+        def inner(request, *args, **kwargs):
+            key = request.META.get(HEADER)
+            ttl = app_settings.IDEMPOTENCY_TTL
+            if not key or not ttl:
+                return func(request, *args, **kwargs)
+
+            cache_key = CACHE_FORMAT % {
+                'scope': scope, 'key': hashlib.md5(key.encode('utf-8')).hexdigest()}
+            fingerprint = get_fingerprint(request)
+            deadline = time.time() + app_settings.IDEMPOTENCY_WAIT
+            while not cache.add(cache_key, {'fingerprint': fingerprint}, PENDING_TIMEOUT):
+                entry = cache.get(cache_key)
+                if entry is not None and 'status' in entry:
+                    return replay(entry, fingerprint)
+                if time.time() >= deadline:
+                    metrics.registry.incr('idempotency', 'conflict')
+                    response = Response(
+                        {'detail': 'A request with this Idempotency-Key is in progress.'},
+                        status=status.HTTP_409_CONFLICT)
+                    response['Retry-After'] = '1'
+                    return response
+                time.sleep(POLL_INTERVAL)
+
+            try:
+                response = func(request, *args, **kwargs)
+            except Exception:
+                cache.delete(cache_key)
+                raise
+            if response.status_code >= 500:
+                cache.delete(cache_key)
+            else:
+                cache.set(cache_key, {'fingerprint': fingerprint,
+                                      'status': response.status_code,
+                                      'data': response.data}, ttl)
+            return response
+        return inner
+    return decorator
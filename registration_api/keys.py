@@ -0,0 +1,80 @@
+import base64
+import binascii
+import hashlib
+import random
+import re
+
+try:
+    from secrets import token_bytes
+except ImportError:
+    # Python < 3.6, os.urandom is what secrets uses.
+    from os import urandom as token_bytes
+
+from django.utils.importlib import import_module
+
+from .app_settings import app_settings
+
+
+KEY_BYTES = 20
+HEX_KEY_RE = re.compile('^[a-f0-9]{40}$')
+
+
+class KeyGenerator(object):
+    """
+    Base class of the activation key generators set with
+    ``REGISTRATION_API_ACTIVATION_KEY_GENERATOR``. Keys must be 40
+    lowercase hexadecimal characters, the format ``utils.SHA1_RE``
+    checks and the activation URL pattern accepts.
+
+    """
+    def generate(self, user):
+        raise NotImplementedError('.generate() must be overridden')
+
+
+class RandomKeyGenerator(KeyGenerator):
+    """20 bytes from the operating system's random source, hex encoded."""
+
+    def generate(self, user):
+        return binascii.hexlify(token_bytes(KEY_BYTES)).decode('ascii')
+
+
+class SHA1KeyGenerator(KeyGenerator):
+    """
+    The keys of django-registration: a SHA1 of the username and a salt
+    from ``random.random()``. Predictable, only kept for compatibility.
+
+    """
+    def generate(self, user):
+        username = getattr(user, user.USERNAME_FIELD)
+        salt_bytes = str(random.random()).encode('utf-8')
+        salt = hashlib.sha1(salt_bytes).hexdigest()[:5]
+        hash_input = (salt + username).encode('utf-8')
+        return hashlib.sha1(hash_input).hexdigest()
+
+
+_generators = {}
+
+
+def get_key_generator():
+    """Return the configured generator, instantiated once per process."""
+    path = app_settings.ACTIVATION_KEY_GENERATOR
+    if path not in _generators:
+        module_path, class_name = path.rsplit('.', 1)
+        _generators[path] = getattr(import_module(module_path), class_name)()
+    return _generators[path]
+
+
+def compact_key(activation_key):
+    """
+    Return the 27 characters base64url form of a 40 characters hex key,
+    as stored in ``RegistrationProfile.compact_key``.
+
+    """
+    raw = binascii.unhexlify(activation_key.encode('ascii'))
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def expand_key(compact):
+    """Return the hex key of a ``compact_key``."""
+    raw = base64.urlsafe_b64decode((compact + '=').encode('ascii'))
+    return binascii.hexlify(raw).decode('ascii')
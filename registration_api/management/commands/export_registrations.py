@@ -0,0 +1,41 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from registration_api.export import EXPORTERS, export_registrations
+from registration_api.models import RegistrationProfile
+
+
+STATES = ['pending', 'expired', 'unactivated']
+
+
+class Command(BaseCommand):
+    help = 'Stream the registrations not activated yet as CSV or JSON lines.'
+    option_list = BaseCommand.option_list + (
+        make_option('--state', type='choice', choices=STATES, dest='state',
+                    default='unactivated',
+                    help='Registrations to export: %s.' % ', '.join(STATES)),
+        make_option('--format', type='choice', choices=sorted(EXPORTERS),
+                    dest='format', default='csv', help='csv or jsonl.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=1000,
+                    help='Number of registrations read per query.'),
+        make_option('--output', dest='output',
+                    help='File to write to, standard output by default.'),
+    )
+
+    def handle(self, *args, **options):
+        profiles = RegistrationProfile.objects
+        if options['state'] == 'pending':
+            queryset = profiles.pending()
+        elif options['state'] == 'expired':
+            queryset = profiles.expired()
+        else:
+            queryset = profiles.exclude(state=RegistrationProfile.ACTIVE)
+        lines = export_registrations(queryset, options['format'], options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                for line in lines:
+                    output.write(line)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
@@ -0,0 +1,43 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from registration_api import utils
+
+
+class Command(BaseCommand):
+    help = ('Delete users whose registration expired before they '
+            'activated their account, and the sent activation emails.')
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=1000,
+                    help='Number of users deleted per transaction.'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Only report how many users would be deleted.'),
+    )
+
+    def handle(self, *args, **options):
+        verbosity = int(options['verbosity'])
+        if options['dry_run']:
+            count = utils.count_expired_registrations(options['batch_size'])
+            if verbosity > 0:
+                self.stdout.write('%d expired registrations would be deleted.' % count)
+                self.stdout.write('%d activation emails would be deleted.' % (
+                    utils.get_purgeable_activation_emails().count()))
+            return
+
+        start = time.time()
+        total = 0
+        for deleted in utils.purge_expired_registrations(options['batch_size']):
+            total += deleted
+            if verbosity > 1:
+                self.stdout.write('Deleted %d expired registrations.' % deleted)
+        elapsed = time.time() - start
+        if verbosity > 0:
+            self.stdout.write(
+                'Deleted %d expired registrations in %.2fs (%.0f/s).' % (
+                    total, elapsed, total / elapsed if elapsed else total))
+
+        emails = sum(utils.purge_activation_emails(options['batch_size']))
+        if verbosity > 0:
+            self.stdout.write('Deleted %d activation emails.' % emails)
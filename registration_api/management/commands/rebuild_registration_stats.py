@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from registration_api import utils
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily registration statistics from the registrations.'
+
+    def handle(self, *args, **options):
+        days = utils.rebuild_stats()
+        if int(options['verbosity']) > 0:
+            self.stdout.write('Rebuilt the registration statistics of %d days.' % days)
@@ -0,0 +1,34 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from registration_api import utils
+
+
+class Command(BaseCommand):
+    help = 'Deliver activation emails waiting in the outbox.'
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=100,
+                    help='Number of emails sent over one mail connection.'),
+        make_option('--loop', action='store_true', dest='loop', default=False,
+                    help='Keep draining the outbox until interrupted.'),
+        make_option('--sleep', type='float', dest='sleep', default=5,
+                    help='Seconds to wait when the outbox is empty (with --loop).'),
+    )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = utils.send_queued_activation_emails(batch_size)
+            total_sent += sent
+            total_failed += failed
+            if not options['loop']:
+                if sent + failed < batch_size:
+                    break
+            elif not sent + failed:
+                time.sleep(options['sleep'])
+        if int(options['verbosity']) > 0:
+            self.stdout.write('Sent %d activation emails, %d failed.' % (
+                total_sent, total_failed))
@@ -0,0 +1,36 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from registration_api import utils
+from registration_api.app_settings import app_settings
+from registration_api.models import RegistrationProfile
+
+
+class Command(BaseCommand):
+    help = ('Move the inactive users waiting for their activation to the '
+            'pending registrations, for REGISTRATION_API_DEFER_USER_CREATION.')
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=1000,
+                    help='Number of registrations moved per transaction.'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Only report how many registrations may be moved.'),
+    )
+
+    def handle(self, *args, **options):
+        if not app_settings.DEFER_USER_CREATION:
+            raise CommandError('REGISTRATION_API_DEFER_USER_CREATION is not enabled.')
+        verbosity = int(options['verbosity'])
+        if options['dry_run']:
+            count = RegistrationProfile.objects.pending().count()
+            if verbosity > 0:
+                self.stdout.write('%d pending registrations may be moved.' % count)
+            return
+
+        total = 0
+        for moved in utils.stage_pending_registrations(options['batch_size']):
+            total += moved
+            if verbosity > 1:
+                self.stdout.write('Moved %d pending registrations.' % moved)
+        if verbosity > 0:
+            self.stdout.write('Moved %d pending registrations.' % total)
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from registration_api.app_settings import app_settings
+from registration_api.bloom import user_filter
+
+
+class Command(BaseCommand):
+    help = ('Build the Bloom filter of the registered usernames and emails '
+            'and store it in the cache for every process to load.')
+
+    def handle(self, *args, **options):
+        if not app_settings.USER_FILTER:
+            raise CommandError('REGISTRATION_API_USER_FILTER is not enabled.')
+        try:
+            bloom_filter = user_filter.warm()
+        except ValueError as e:
+            raise CommandError('%s Raise the cache item size limit (memcached -I) '
+                               'or lower the capacity.' % e)
+        if int(options['verbosity']) > 0:
+            self.stdout.write(
+                'Stored a filter of %d bytes (%d hashes) sized for %d values.' % (
+                    len(bloom_filter.bits), bloom_filter.hashes, bloom_filter.capacity))
@@ -0,0 +1,139 @@
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.utils.importlib import import_module
+
+from .app_settings import app_settings
+
+
+class Registry(object):
+    """
+    In-process counters and timers of the registration operations.
+
+    Every operation has a call counter per outcome (``success`` or
+    ``failure``) and a timer holding the number of calls and their total
+    duration. Each measurement is also passed on to the sinks listed in
+    ``REGISTRATION_API_METRICS_SINKS``.
+
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sinks = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.timers = {}
+
+    @property
+    def sinks(self):
+        paths = tuple(app_settings.METRICS_SINKS)
+        if self._sinks is None or self._sinks[0] != paths:
+            self._sinks = (paths, [import_sink(path)() for path in paths])
+        return self._sinks[1]
+
+    def incr(self, name, outcome='success', value=1):
+        with self._lock:
+            key = (name, outcome)
+            self.counters[key] = self.counters.get(key, 0) + value
+        for sink in self.sinks:
+            sink.incr(name, outcome, value)
+
+    def timing(self, name, seconds):
+        with self._lock:
+            count, total = self.timers.get(name, (0, 0.0))
+            self.timers[name] = (count + 1, total + seconds)
+        for sink in self.sinks:
+            sink.timing(name, seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Time the block and count it as a failure if it raises."""
+        start = time.time()
+        outcome = 'failure'
+        try:
+            yield
+            outcome = 'success'
+        finally:
+            self.timing(name, time.time() - start)
+            self.incr(name, outcome)
+
+    def timed(self, name):
+        """
+        Decorator timing each call of the function. A call fails when
+        it raises, returns ``False`` or a response with an error status
+        code.
+
+        """
+        def decorator(func):
+            @wraps(func)
+            def inner(*args, **kwargs):
+                start = time.time()
+                outcome = 'failure'
+                try:
+                    result = func(*args, **kwargs)
+                    if result is not False and getattr(result, 'status_code', 200) < 400:
+                        outcome = 'success'
+                    return result
+                finally:
+                    self.timing(name, time.time() - start)
+                    self.incr(name, outcome)
+            return inner
+        return decorator
+
+    def render_prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+        lines = ['# TYPE registration_api_calls_total counter']
+        for (name, outcome), value in counters:
+            lines.append('registration_api_calls_total{operation="%s",outcome="%s"} %d' % (
+                name, outcome, value))
+        lines.append('# TYPE registration_api_duration_seconds summary')
+        for name, (count, total) in timers:
+            lines.append('registration_api_duration_seconds_count{operation="%s"} %d' % (
+                name, count))
+            lines.append('registration_api_duration_seconds_sum{operation="%s"} %f' % (
+                name, total))
+        return '\n'.join(lines) + '\n'
+
+
+def import_sink(path):
+    module_path, class_name = path.rsplit('.', 1)
+    return getattr(import_module(module_path), class_name)
+
+
+class StatsdSink(object):
+    """
+    Send the metrics to a StatsD server over UDP, configured with
+    ``REGISTRATION_API_STATSD_HOST``, ``REGISTRATION_API_STATSD_PORT``
+    and ``REGISTRATION_API_STATSD_PREFIX``. Errors are ignored, metrics
+    must never break a registration.
+
+    """
+    def __init__(self):
+        self.address = (app_settings.STATSD_HOST, app_settings.STATSD_PORT)
+        self.prefix = app_settings.STATSD_PREFIX
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, data):
+        try:
+            self.socket.sendto(data.encode('utf-8'), self.address)
+        except (socket.error, socket.gaierror):
+            pass
+
+    def incr(self, name, outcome, value):
+        self.send('%s.%s.%s:%d|c' % (self.prefix, name, outcome, value))
+
+    def timing(self, name, seconds):
+        self.send('%s.%s:%d|ms' % (self.prefix, name, seconds * 1000))
+
+
+registry = Registry()
+timer = registry.timer
+timed = registry.timed
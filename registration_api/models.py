@@ -5,6 +5,47 @@ from django.db import models
 from django.utils.timezone import now as datetime_now
 from django.utils.translation import ugettext_lazy as _
 
+from . import apps, keys
+from .app_settings import app_settings
+
+
+def expiration_date():
+    """Return when a key issued now expires."""
+    return datetime_now() + datetime.timedelta(
+        days=app_settings.ACCOUNT_ACTIVATION_DAYS)
+
+
+class RegistrationManager(models.Manager):
+
+    def for_key(self, activation_key):
+        """
+        Return the profiles of ``activation_key``, stored in full or, for
+        hex keys, in ``compact_key``. Both are looked up whatever
+        ``REGISTRATION_API_COMPACT_ACTIVATION_KEYS`` is, so keys stored
+        before it was turned off keep working.
+
+        """
+        query = models.Q(activation_key=activation_key)
+        if keys.HEX_KEY_RE.search(activation_key):
+            query |= models.Q(compact_key=keys.compact_key(activation_key))
+        return self.filter(query)
+
+    def expired(self):
+        """
+        Return the profiles of users who never activated their account
+        and whose activation key has expired, as a range scan of the
+        ``(state, expires_at)`` index that never reads the user table.
+
+        """
+        return self.filter(
+            state__in=(self.model.PENDING, self.model.EXPIRED),
+            expires_at__lte=datetime_now())
+
+    def pending(self):
+        """Return the profiles still waiting for an activation."""
+        return self.filter(state=self.model.PENDING,
+                           expires_at__gt=datetime_now())
+
 
 class RegistrationProfile(models.Model):
     """
@@ -12,36 +53,117 @@ class RegistrationProfile(models.Model):
     user account registration.
 
     """
+    # Written over the key of activated profiles before ``state``
+    # existed. Only found in rows migrated from older versions.
     ACTIVATED = u"ALREADY_ACTIVATED"
 
+    PENDING = 0
+    ACTIVE = 1
+    EXPIRED = 2
+    STATE_CHOICES = (
+        (PENDING, _('pending')),
+        (ACTIVE, _('activated')),
+        (EXPIRED, _('expired')),
+    )
+
     user = models.OneToOneField(settings.AUTH_USER_MODEL, unique=True, verbose_name=_('user'), related_name='api_registration_profile')
-    activation_key = models.CharField(_('activation key'), max_length=40)
+    activation_key = models.CharField(_('activation key'), max_length=40, db_index=True, blank=True)
+    # The key in 27 characters, with REGISTRATION_API_COMPACT_ACTIVATION_KEYS.
+    compact_key = models.CharField(_('compact activation key'), max_length=27,
+                                   unique=True, null=True, blank=True)
+    state = models.PositiveSmallIntegerField(_('state'), choices=STATE_CHOICES, default=PENDING)
+    expires_at = models.DateTimeField(_('expires at'), default=expiration_date)
+    activated_at = models.DateTimeField(_('activated at'), null=True, blank=True)
+
+    objects = RegistrationManager()
+
+    class Meta:
+        index_together = [('state', 'expires_at')]
+
+    def get_activation_key(self):
+        """Return the key sent to the user, however it is stored."""
+        if self.compact_key:
+            return keys.expand_key(self.compact_key)
+        return self.activation_key
 
     def activation_key_expired(self):
         """
         Determine whether this ``RegistrationProfile``'s activation
         key has expired, returning a boolean -- ``True`` if the key
         has expired.
-        Key expiration is determined by a two-step process:
-        1. If the user has already activated, the key will have been
-        reset to the string constant ``ACTIVATED``. Re-activating
-        is not permitted, and so this method returns ``True`` in
-        this case.
-
-        2. Otherwise, the date the user signed up is incremented by
-        the number of days specified in the setting
-        ``REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS`` (which should be
-        the number of days after signup during which a user is allowed
-        to activate their account); if the result is less than or
-        equal to the current date, the key has expired and this method
-        returns ``True``.
+
+        The key has expired if the profile is no longer ``PENDING``
+        (re-activating is not permitted) or once ``expires_at``, set
+        ``REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS`` after the profile
+        was created, has passed.
 
         """
+        return self.state != self.PENDING or self.expires_at <= datetime_now()
+
+
+class ActivationEmail(models.Model):
+    """
+    An activation email waiting in the outbox.
+
+    Rows are written in the same transaction that creates the
+    inactive user, and delivered later by the
+    ``send_activation_emails`` management command.
+
+    """
+    email = models.EmailField(_('email address'), max_length=254)
+    activation_key = models.CharField(_('activation key'), max_length=40)
+    created = models.DateTimeField(_('created'), default=datetime_now)
+    next_attempt = models.DateTimeField(_('next attempt'), default=datetime_now, db_index=True)
+    attempts = models.PositiveSmallIntegerField(_('attempts'), default=0)
+    sent = models.DateTimeField(_('sent'), null=True, blank=True)
+    last_error = models.TextField(_('last error'), blank=True)
+
+    class Meta:
+        ordering = ('next_attempt', )
+
+
+class PendingRegistration(models.Model):
+    """
+    A registration waiting for its activation, stored instead of an
+    inactive user when ``REGISTRATION_API_DEFER_USER_CREATION`` is set.
+    ``utils.activate_user`` creates the user from it.
+
+    """
+    # The value of the user model's USERNAME_FIELD.
+    username = models.CharField(_('username'), max_length=254, unique=True)
+    email = models.EmailField(_('email address'), max_length=254)
+    password = models.CharField(_('password'), max_length=128)
+    compact_key = models.CharField(_('compact activation key'), max_length=27, unique=True)
+    created = models.DateTimeField(_('created'), default=datetime_now)
+    expires_at = models.DateTimeField(_('expires at'), default=expiration_date, db_index=True)
+
+    def get_activation_key(self):
+        return keys.expand_key(self.compact_key)
+
+    def activation_key_expired(self):
+        return self.expires_at <= datetime_now()
+
+
+class RegistrationStats(models.Model):
+    """
+    Daily registration counters, kept up to date by ``create_inactive_user``
+    and ``activate_user`` when ``REGISTRATION_API_TRACK_STATS`` is set
+    and rebuilt by the ``rebuild_registration_stats`` command.
+
+    ``expired`` counts the registrations expiring that day which were
+    not activated, so it is only final once the day is over.
+
+    """
+    date = models.DateField(_('date'), unique=True)
+    # Not positive: counters updated before a rebuild may drift below 0.
+    registered = models.IntegerField(_('registered'), default=0)
+    activated = models.IntegerField(_('activated'), default=0)
+    expired = models.IntegerField(_('expired'), default=0)
+
+    class Meta:
+        ordering = ('-date', )
+        verbose_name_plural = _('registration stats')
 
-        # utils imported here to avoid circular import
-        import utils
 
-        expiration_date = datetime.timedelta(
-            days=utils.get_settings('REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS'))
-        return self.activation_key == self.ACTIVATED or \
-            (self.user.date_joined + expiration_date <= datetime_now())
+if not apps.HAS_APP_REGISTRY:
+    apps.setup()
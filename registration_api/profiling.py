@@ -0,0 +1,124 @@
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from .app_settings import app_settings
+
+
+class StackSampler(object):
+    """
+    Sample the stack of the current thread every ``interval`` seconds
+    from a background thread, counting each stack (outermost frame
+    first) in ``stacks``. Unlike ``cProfile`` the sampled code runs at
+    full speed, so every request may be watched.
+
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.thread_id = threading.current_thread().ident
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[self.format_stack(frame)] += 1
+
+    def format_stack(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename),
+                                         code.co_firstlineno))
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def dump(self, path):
+        """Write the stacks in the collapsed format read by flame graph tools."""
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('%s %d\n' % (stack, count))
+
+
+def get_profile_path(name, extension):
+    return os.path.join(app_settings.PROFILE_DIR, '%s-%s-%d-%d.%s' % (
+        name, time.strftime('%Y%m%d%H%M%S'), os.getpid(),
+        int(time.time() * 1000000) % 1000000, extension))
+
+
+def write_profile(name, extension, dump):
+    """
+    Write a profile of ``name`` with ``dump(path)``, then delete the
+    oldest ones beyond ``REGISTRATION_API_PROFILE_KEEP``. Errors are
+    ignored, profiling must never break a request.
+
+    """
+    directory = app_settings.PROFILE_DIR
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        dump(get_profile_path(name, extension))
+        paths = [os.path.join(directory, filename) for filename in os.listdir(directory)
+                 if filename.startswith(name + '-')]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:-app_settings.PROFILE_KEEP]:
+            os.remove(path)
+    except (IOError, OSError):
+        pass
+
+
+def profiled(name):
+    """
+    Decorator profiling a sample of the calls of the view ``name``.
+
+    A ``REGISTRATION_API_PROFILE_SAMPLE_RATE`` fraction of the calls is
+    run under ``cProfile`` and saved as a ``.pstats`` file. With
+    ``REGISTRATION_API_PROFILE_SLOW_THRESHOLD`` (in seconds) the other
+    calls are watched by a ``StackSampler`` and those slower than the
+    threshold are saved as ``.collapsed`` stacks. Files are written to
+    ``REGISTRATION_API_PROFILE_DIR``, keeping the last
+    ``REGISTRATION_API_PROFILE_KEEP`` of each view.
+
+    """
+    def decorator(func):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            sample_rate = app_settings.PROFILE_SAMPLE_RATE
+            if sample_rate and random.random() < sample_rate:
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(func, *args, **kwargs)
+                finally:
+                    write_profile(name, 'pstats', profile.dump_stats)
+            threshold = app_settings.PROFILE_SLOW_THRESHOLD
+            if not threshold:
+                return func(*args, **kwargs)
+            sampler = StackSampler(app_settings.PROFILE_INTERVAL)
+            start = time.time()
+            sampler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sampler.stop()
+                if time.time() - start >= threshold:
+                    write_profile(name, 'collapsed', sampler.dump)
+        return inner
+    return decorator
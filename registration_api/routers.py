@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.db import router
+
+from .app_settings import app_settings
+
+
+APP_LABEL = 'registration_api'
+
+
+class RegistrationRouter(object):
+    """
+    Place the registration tables (profiles, the email outbox and the
+    statistics) on the ``REGISTRATION_API_DATABASE`` alias
+
+    .. code-block:: python
+
+        DATABASE_ROUTERS = ['registration_api.routers.RegistrationRouter']
+
+    Their tables are only created on that alias, but for the (empty)
+    profile table on the users' database: deleting a user looks for its
+    profile there. Other models are left to the next routers. Activation lookups read
+    from ``REGISTRATION_API_READ_DATABASE`` (see ``utils.activate_user``),
+    not through the router, so the rest of the registration reads see
+    their own writes.
+
+    """
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == APP_LABEL:
+            return app_settings.DATABASE
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Profiles point to users, wherever they are stored.
+        labels = set([obj1._meta.app_label, obj2._meta.app_label])
+        if APP_LABEL in labels:
+            user_model = get_user_model()
+            others = [obj for obj in (obj1, obj2) if obj._meta.app_label != APP_LABEL]
+            return all(isinstance(obj, user_model) for obj in others)
+        return None
+
+    def allow_syncdb(self, db, model):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        if db == app_settings.DATABASE:
+            return True
+        user_model = get_user_model()
+        return (db == router.db_for_write(user_model) and
+                any(field.rel and field.rel.to is user_model
+                    for field in model._meta.fields))
+
+    # Django >= 1.7
+    allow_migrate = allow_syncdb
@@ -1,7 +1,18 @@
 from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.models import Q
+from django.utils import six
+from django.utils.datastructures import SortedDict
+from django.utils.text import capfirst
+from django.utils.timezone import now as datetime_now
 
 from rest_framework import serializers
 
+from .app_settings import app_settings
+from .bloom import user_filter
+from .models import PendingRegistration
+from .user_fields import get_registration_fields
+
 
 class UserSerializer(serializers.ModelSerializer):
 
@@ -13,3 +24,149 @@ class UserSerializer(serializers.ModelSerializer):
         ret = super(UserSerializer, self).to_native(obj)
         del ret['password']
         return ret
+
+
+class RegistrationSerializer(serializers.Serializer):
+    """
+    Validate the data of a registration: the user model's
+    ``USERNAME_FIELD``, ``email`` and ``password``. Once valid,
+    ``object`` holds the keyword arguments of
+    ``utils.create_inactive_user``.
+
+    """
+    # Long enough for any passphrase, short enough not to keep the
+    # password hasher busy.
+    password = serializers.CharField(max_length=4096)
+
+    def get_default_fields(self):
+        fields = SortedDict()
+        for name, model_field in get_registration_fields(get_user_model()):
+            if isinstance(model_field, models.EmailField):
+                field_class = serializers.EmailField
+            else:
+                field_class = serializers.CharField
+            field = field_class(max_length=model_field.max_length,
+                                required=not model_field.blank)
+            # Add the model field's validators, such as the username
+            # pattern, but not the ones the field already runs.
+            types = set(type(validator) for validator in field.validators)
+            field.validators.extend(validator for validator in model_field.validators
+                                    if type(validator) not in types)
+            fields[name] = field
+        return fields
+
+    def validate(self, attrs):
+        """
+        Check the unique fields with a single query. Values the user
+        filter (``REGISTRATION_API_USER_FILTER``) knows are free are not
+        looked up, unless user creation is deferred: no constraint would
+        catch a duplicate of a user the filter missed. With a false ``check_unique`` context they are not
+        checked at all, see ``get_bulk_unique_errors``.
+
+        """
+        if self.context.get('check_unique', True):
+            self._errors.update(self.get_unique_errors(attrs, use_filter=True))
+        return attrs
+
+    def get_unique_errors(self, attrs, use_filter=False):
+        """Return the errors of the unique fields already taken in ``attrs``."""
+        user_model = get_user_model()
+        unique_fields = [(name, model_field)
+                         for name, model_field in get_registration_fields(user_model)
+                         if model_field.unique and attrs.get(name)]
+        if use_filter and not app_settings.DEFER_USER_CREATION:
+            unique_fields = [(name, model_field) for name, model_field in unique_fields
+                             if user_filter.might_contain(name, attrs[name])]
+        errors = {}
+        if not unique_fields:
+            return errors
+        taken = self.get_taken(user_model._default_manager.all(), unique_fields, attrs)
+        if app_settings.DEFER_USER_CREATION:
+            # Staged registrations hold the value of USERNAME_FIELD in username.
+            columns = dict((name, 'username' if name == user_model.USERNAME_FIELD else name)
+                           for name, model_field in unique_fields)
+            pending = PendingRegistration.objects.filter(expires_at__gt=datetime_now())
+            taken |= self.get_taken(pending, unique_fields, attrs, columns)
+        for name, model_field in unique_fields:
+            if name in taken:
+                errors[name] = [get_unique_error(user_model, model_field)]
+        return errors
+
+    def get_taken(self, queryset, unique_fields, attrs, columns=None):
+        """
+        Return the names of the ``unique_fields`` whose value in ``attrs``
+        is found in ``queryset``, ``columns`` mapping names to the
+        queryset's fields.
+
+        """
+        columns = columns or {}
+        names = [columns.get(name, name) for name, model_field in unique_fields]
+        query = Q()
+        for column, (name, model_field) in zip(names, unique_fields):
+            query |= Q(**{column: attrs[name]})
+        taken = set()
+        for row in queryset.filter(query).values_list(*names):
+            for (name, model_field), value in zip(unique_fields, row):
+                if value == attrs[name]:
+                    taken.add(name)
+        return taken
+
+    def restore_object(self, attrs, instance=None):
+        user_model = get_user_model()
+        data = {'password': attrs['password']}
+        for name, model_field in get_registration_fields(user_model):
+            if name not in attrs:
+                continue
+            if name == user_model.USERNAME_FIELD and name != 'email':
+                data['username'] = attrs[name]
+            else:
+                data[name] = attrs[name]
+        return data
+
+
+def get_unique_error(user_model, model_field):
+    return model_field.error_messages['unique'] % {
+        'model_name': six.text_type(capfirst(user_model._meta.verbose_name)),
+        'field_label': six.text_type(capfirst(model_field.verbose_name)),
+    }
+
+
+def get_bulk_unique_errors(attrs_list, chunk_size=500):
+    """
+    Return the errors of the unique fields of each item of
+    ``attrs_list``, for values already taken or used by a previous item.
+    Values are looked up with one ``__in`` query per unique field and
+    ``chunk_size`` values.
+
+    """
+    user_model = get_user_model()
+    unique_fields = [(name, model_field)
+                     for name, model_field in get_registration_fields(user_model)
+                     if model_field.unique]
+    querysets = [(user_model._default_manager.all(), {})]
+    if app_settings.DEFER_USER_CREATION:
+        querysets.append((PendingRegistration.objects.filter(expires_at__gt=datetime_now()),
+                          {user_model.USERNAME_FIELD: 'username'}))
+    taken = {}
+    for name, model_field in unique_fields:
+        values = list(set(attrs[name] for attrs in attrs_list if attrs.get(name)))
+        taken[name] = set()
+        for queryset, columns in querysets:
+            column = columns.get(name, name)
+            for i in range(0, len(values), chunk_size):
+                taken[name].update(queryset.filter(**{
+                    '%s__in' % column: values[i:i + chunk_size]}).values_list(column, flat=True))
+
+    errors_list = []
+    for attrs in attrs_list:
+        errors = {}
+        for name, model_field in unique_fields:
+            value = attrs.get(name)
+            if value and value in taken[name]:
+                errors[name] = [get_unique_error(user_model, model_field)]
+        if not errors:
+            for name, model_field in unique_fields:
+                if attrs.get(name):
+                    taken[name].add(attrs[name])
+        errors_list.append(errors)
+    return errors_list
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+from registration_api.south_migrations import (
+    user_frozen_model, user_model_label, user_orm_label)
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'RegistrationProfile'
+        db.create_table(u'registration_api_registrationprofile', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('user', self.gf('django.db.models.fields.related.OneToOneField')(related_name='api_registration_profile', unique=True, to=orm[user_orm_label])),
+            ('activation_key', self.gf('django.db.models.fields.CharField')(max_length=40)),
+        ))
+        db.send_create_signal(u'registration_api', ['RegistrationProfile'])
+
+        # Adding model 'ActivationEmail'
+        db.create_table(u'registration_api_activationemail', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('email', self.gf('django.db.models.fields.EmailField')(max_length=254)),
+            ('activation_key', self.gf('django.db.models.fields.CharField')(max_length=40)),
+            ('created', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+            ('next_attempt', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now, db_index=True)),
+            ('attempts', self.gf('django.db.models.fields.PositiveSmallIntegerField')(default=0)),
+            ('sent', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('last_error', self.gf('django.db.models.fields.TextField')(blank=True)),
+        ))
+        db.send_create_signal(u'registration_api', ['ActivationEmail'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'RegistrationProfile'
+        db.delete_table(u'registration_api_registrationprofile')
+
+        # Deleting model 'ActivationEmail'
+        db.delete_table(u'registration_api_activationemail')
+
+
+    models = {
+        user_model_label: user_frozen_model,
+        u'registration_api.activationemail': {
+            'Meta': {'ordering': "('next_attempt',)", 'object_name': 'ActivationEmail'},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'attempts': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '254'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'next_attempt': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now', 'db_index': 'True'}),
+            'sent': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        u'registration_api.registrationprofile': {
+            'Meta': {'object_name': 'RegistrationProfile'},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'user': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'api_registration_profile'", 'unique': 'True', 'to': "orm['%s']" % user_orm_label})
+        }
+    }
+
+    complete_apps = ['registration_api']
\ No newline at end of file
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+from registration_api.south_migrations import (
+    user_frozen_model, user_model_label, user_orm_label)
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding index on 'RegistrationProfile', fields ['activation_key']
+        db.create_index(u'registration_api_registrationprofile', ['activation_key'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'RegistrationProfile', fields ['activation_key']
+        db.delete_index(u'registration_api_registrationprofile', ['activation_key'])
+
+
+    models = {
+        user_model_label: user_frozen_model,
+        u'registration_api.activationemail': {
+            'Meta': {'ordering': "('next_attempt',)", 'object_name': 'ActivationEmail'},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'attempts': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '254'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'next_attempt': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now', 'db_index': 'True'}),
+            'sent': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        u'registration_api.registrationprofile': {
+            'Meta': {'object_name': 'RegistrationProfile'},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'user': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'api_registration_profile'", 'unique': 'True', 'to': "orm['%s']" % user_orm_label})
+        }
+    }
+
+    complete_apps = ['registration_api']
\ No newline at end of file
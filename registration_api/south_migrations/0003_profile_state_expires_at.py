@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+from registration_api.south_migrations import (
+    user_frozen_model, user_model_label, user_orm_label)
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding field 'RegistrationProfile.state'
+        db.add_column(u'registration_api_registrationprofile', 'state',
+                      self.gf('django.db.models.fields.PositiveSmallIntegerField')(default=0),
+                      keep_default=False)
+
+        # Adding field 'RegistrationProfile.expires_at', backfilled by 0004
+        db.add_column(u'registration_api_registrationprofile', 'expires_at',
+                      self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now()),
+                      keep_default=False)
+
+        # Adding index on 'RegistrationProfile', fields ['state', 'expires_at']
+        db.create_index(u'registration_api_registrationprofile', ['state', 'expires_at'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'RegistrationProfile', fields ['state', 'expires_at']
+        db.delete_index(u'registration_api_registrationprofile', ['state', 'expires_at'])
+
+        # Deleting field 'RegistrationProfile.state'
+        db.delete_column(u'registration_api_registrationprofile', 'state')
+
+        # Deleting field 'RegistrationProfile.expires_at'
+        db.delete_column(u'registration_api_registrationprofile', 'expires_at')
+
+
+    models = {
+        user_model_label: user_frozen_model,
+        u'registration_api.activationemail': {
+            'Meta': {'ordering': "('next_attempt',)", 'object_name': 'ActivationEmail'},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'attempts': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '254'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'next_attempt': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now', 'db_index': 'True'}),
+            'sent': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        u'registration_api.registrationprofile': {
+            'Meta': {'object_name': 'RegistrationProfile', 'index_together': "[('state', 'expires_at')]"},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'}),
+            'expires_at': ('django.db.models.fields.DateTimeField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'state': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'user': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'api_registration_profile'", 'unique': 'True', 'to': "orm['%s']" % user_orm_label})
+        }
+    }
+
+    complete_apps = ['registration_api']
\ No newline at end of file
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import DataMigration
+from django.conf import settings
+from django.db import models
+from django.utils.timezone import now
+
+from registration_api.south_migrations import (
+    User, user_frozen_model, user_model_label, user_orm_label)
+
+
+# Legacy value of ``activation_key`` once activated.
+ACTIVATED = u"ALREADY_ACTIVATED"
+PENDING, ACTIVE, EXPIRED = 0, 1, 2
+
+# Expiry was computed from the date the user joined, when the model has
+# one; profiles of other user models get a full activation period.
+has_date_joined = 'date_joined' in [f.name for f in User._meta.fields]
+user_model = dict(user_frozen_model)
+if has_date_joined:
+    user_model['date_joined'] = ('django.db.models.fields.DateTimeField', [], {})
+
+
+class Migration(DataMigration):
+
+    def forwards(self, orm):
+        profiles = orm.RegistrationProfile.objects
+        days = datetime.timedelta(
+            days=getattr(settings, 'REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS', 7))
+        current_time = now()
+        profiles.filter(activation_key=ACTIVATED).update(state=ACTIVE)
+        if has_date_joined:
+            rows = profiles.values_list('pk', 'user__date_joined')
+            for pk, date_joined in rows.iterator():
+                profiles.filter(pk=pk).update(expires_at=date_joined + days)
+        else:
+            profiles.update(expires_at=current_time + days)
+        profiles.filter(state=PENDING, expires_at__lte=current_time).update(state=EXPIRED)
+
+    def backwards(self, orm):
+        orm.RegistrationProfile.objects.filter(state=ACTIVE).update(
+            activation_key=ACTIVATED)
+
+    models = {
+        user_model_label: user_model,
+        u'registration_api.activationemail': {
+            'Meta': {'ordering': "('next_attempt',)", 'object_name': 'ActivationEmail'},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'attempts': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '254'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'next_attempt': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now', 'db_index': 'True'}),
+            'sent': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        u'registration_api.registrationprofile': {
+            'Meta': {'object_name': 'RegistrationProfile', 'index_together': "[('state', 'expires_at')]"},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'}),
+            'expires_at': ('django.db.models.fields.DateTimeField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'state': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'user': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'api_registration_profile'", 'unique': 'True', 'to': "orm['%s']" % user_orm_label})
+        }
+    }
+
+    complete_apps = ['registration_api']
+    symmetrical = True
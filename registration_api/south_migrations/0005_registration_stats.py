@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+from registration_api.south_migrations import (
+    user_frozen_model, user_model_label, user_orm_label)
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'RegistrationStats'
+        db.create_table(u'registration_api_registrationstats', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('date', self.gf('django.db.models.fields.DateField')(unique=True)),
+            ('registered', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('activated', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('expired', self.gf('django.db.models.fields.IntegerField')(default=0)),
+        ))
+        db.send_create_signal(u'registration_api', ['RegistrationStats'])
+
+        # Adding field 'RegistrationProfile.activated_at'
+        db.add_column(u'registration_api_registrationprofile', 'activated_at',
+                      self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True),
+                      keep_default=False)
+
+
+    def backwards(self, orm):
+        # Deleting model 'RegistrationStats'
+        db.delete_table(u'registration_api_registrationstats')
+
+        # Deleting field 'RegistrationProfile.activated_at'
+        db.delete_column(u'registration_api_registrationprofile', 'activated_at')
+
+
+    models = {
+        user_model_label: user_frozen_model,
+        u'registration_api.activationemail': {
+            'Meta': {'ordering': "('next_attempt',)", 'object_name': 'ActivationEmail'},
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40'}),
+            'attempts': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'created': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '254'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_error': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'next_attempt': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now', 'db_index': 'True'}),
+            'sent': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        u'registration_api.registrationprofile': {
+            'Meta': {'object_name': 'RegistrationProfile', 'index_together': "[('state', 'expires_at')]"},
+            'activated_at': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'activation_key': ('django.db.models.fields.CharField', [], {'max_length': '40', 'db_index': 'True'}),
+            'expires_at': ('django.db.models.fields.DateTimeField', [], {}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'state': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '0'}),
+            'user': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'api_registration_profile'", 'unique': 'True', 'to': "orm['%s']" % user_orm_label})
+        },
+        u'registration_api.registrationstats': {
+            'Meta': {'ordering': "('-date',)", 'object_name': 'RegistrationStats'},
+            'activated': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'date': ('django.db.models.fields.DateField', [], {'unique': 'True'}),
+            'expired': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'registered': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        }
+    }
+
+    complete_apps = ['registration_api']
\ No newline at end of file
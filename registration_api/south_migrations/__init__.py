@@ -0,0 +1,14 @@
+from django.contrib.auth import get_user_model
+
+
+# Freeze the user model by its primary key only, so the migrations
+# work with any ``AUTH_USER_MODEL``.
+User = get_user_model()
+user_orm_label = '%s.%s' % (User._meta.app_label, User._meta.object_name)
+user_model_label = '%s.%s' % (User._meta.app_label, User._meta.module_name)
+user_frozen_model = {
+    'Meta': {'object_name': User.__name__,
+             'db_table': "'%s'" % User._meta.db_table},
+    User._meta.pk.attname: ('django.db.models.fields.AutoField', [],
+                            {'primary_key': 'True'}),
+}
@@ -1,24 +1,48 @@
+from StringIO import StringIO
 from urllib import urlencode
+import datetime
+import hashlib
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import time
+
 import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.sites.models import Site
+from django.core import mail
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
 from django.core.urlresolvers import reverse
+from django.db import IntegrityError, connection, connections
+from django.db.models.signals import post_save
 from django.http import HttpRequest
+from django.template import Template
 from django.test import TestCase
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils.datastructures import MergeDict
+from django.utils.timezone import now as datetime_now
 
 from rest_framework import status
 from rest_framework.response import Response
 
-from registration_api import utils
-from registration_api.models import RegistrationProfile
-from registration_api.serializers import UserSerializer
-from registration_api.views import activate, register
+from registration_api import admin, apps, idempotency, keys, metrics, profiling, utils
+from registration_api.app_settings import DEFAULTS, app_settings
+from registration_api.bloom import CACHE_KEY, BloomFilter, user_filter
+from registration_api.export import export_registrations
+from registration_api.models import (ActivationEmail, PendingRegistration, RegistrationProfile,
+                                     RegistrationStats)
+from registration_api.serializers import (RegistrationSerializer, UserSerializer,
+                                          get_bulk_unique_errors)
+from registration_api.routers import RegistrationRouter
+from registration_api.throttling import CacheBucketThrottle, RegisterIPThrottle
+from registration_api.views import activate, metrics_view, register
 
 
 class WsgiHttpRequest(HttpRequest):
@@ -60,6 +84,7 @@ def MockHttpRequest(path='/', method='GET', GET=None, POST=None, META=None, user
             'SERVER_PORT': '8000',
             'HTTP_REFERER': '',
             'SERVER_NAME': 'testserver',
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded',
         }
     if user is not None:
         user = user
@@ -84,6 +109,21 @@ INVALID_DATA = VALID_DATA.copy()
 INVALID_DATA.pop('password')
 
 
+class CaptureStatements(CaptureQueriesContext):
+    """
+    Capture the queries run on ``connection`` (the default one unless
+    given) leaving out the savepoints added by nested transactions.
+
+    """
+    def __init__(self, connection=connection):
+        super(CaptureStatements, self).__init__(connection)
+
+    @property
+    def statements(self):
+        return [q['sql'] for q in self.captured_queries
+                if 'SAVEPOINT' not in q['sql']]
+
+
 class UtilsTests(TestCase):
 
     def test_VALID_USER_FIELDS(self):
@@ -91,6 +131,16 @@ class UtilsTests(TestCase):
         self.assertListEqual(sorted(utils.VALID_USER_FIELDS),
                              sorted(EXPECTED_VALID_USER_FIELDS))
 
+    def test_get_valid_user_fields(self):
+        self.assertIs(utils.get_valid_user_fields(), utils.get_valid_user_fields())
+
+    def test_setup(self):
+        receivers = len(post_save.receivers)
+
+        apps.setup()
+
+        self.assertEqual(len(post_save.receivers), receivers)
+
     def test_get_user_data(self):
         valid_data = {'id': 1}
         mock_data = valid_data.copy()
@@ -106,20 +156,28 @@ class UtilsTests(TestCase):
         site = Site.objects.get()
         user_model = get_user_model()
         with mock.patch.object(user_model.objects, 'create_user') as mock_create_user:
-            mock_create_user.return_value = get_user_model()(**VALID_DATA)
             user = utils.create_inactive_user(**VALID_DATA)
 
-            if hasattr(user, 'username'):
-                mock_create_user.assert_called_with(VALID_DATA['username'],
-                                                    VALID_DATA['email'],
-                                                    VALID_DATA['password'])
-            else:
-                mock_create_user.assert_called_with(VALID_DATA['email'],
-                                                    VALID_DATA['password'])
-            mock_create_profile.assert_called_with(user)
-            self.assertFalse(user.is_active)
-            self.assertTrue(user.pk)
-            mock_send_activation_email.assert_called_with(user, site)
+            self.assertFalse(mock_create_user.called)
+        mock_create_profile.assert_called_with(user)
+        self.assertTrue(user.pk)
+        user = user_model.objects.get(pk=user.pk)
+        self.assertFalse(user.is_active)
+        self.assertEqual(getattr(user, user_model.USERNAME_FIELD),
+                         VALID_DATA[user_model.USERNAME_FIELD])
+        self.assertEqual(user.email, VALID_DATA['email'])
+        self.assertTrue(user.check_password(VALID_DATA['password']))
+        mock_send_activation_email.assert_called_with(user, site)
+
+    def test_create_inactive_user_num_queries(self):
+        Site.objects.get_current()
+
+        with CaptureStatements() as captured:
+            utils.create_inactive_user(**VALID_DATA)
+
+        # The user and its profile.
+        self.assertEqual(len(captured.statements), 2)
+        self.assertTrue(all('INSERT INTO' in sql for sql in captured.statements))
 
     @mock.patch('registration_api.utils.create_activation_key')
     @mock.patch('registration_api.models.RegistrationProfile.objects.create')
@@ -151,6 +209,38 @@ class UtilsTests(TestCase):
 
         self.assertTrue(user.is_active)
 
+    def test_activate_user_num_queries(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+
+        with CaptureStatements() as captured:
+            user = utils.activate_user(activation_key)
+
+        self.assertTrue(user.is_active)
+        self.assertEqual(len(captured.statements), 3)
+        self.assertTrue(get_user_model().objects.get(pk=user.pk).is_active)
+
+    def test_activate_user_twice(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+
+        self.assertTrue(utils.activate_user(activation_key))
+        self.assertFalse(utils.activate_user(activation_key))
+
+    def test_activate_user_concurrent(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+
+        def activated_by_another_request():
+            RegistrationProfile.objects.filter(user=user).update(
+                state=RegistrationProfile.ACTIVE)
+            return False
+
+        with mock.patch.object(RegistrationProfile, 'activation_key_expired',
+                               side_effect=activated_by_another_request):
+            self.assertFalse(utils.activate_user(activation_key))
+        self.assertFalse(get_user_model().objects.get(pk=user.pk).is_active)
+
     def test_send_activations_email(self):
         user = get_user_model().objects.create(**VALID_DATA)
         RegistrationProfile.objects.create(user=user, activation_key='asdf')
@@ -164,6 +254,35 @@ class UtilsTests(TestCase):
             mock_email_user.assert_called_with(
                 subject, message, settings.DEFAULT_FROM_EMAIL)
 
+    def test_render_activation_emails(self):
+        site = Site.objects.get()
+        template = Template('{{ activation_key }}\n{{ expiration_days }} {{ site.domain }}')
+
+        with mock.patch('registration_api.utils.get_cached_template') as mock_get:
+            mock_get.return_value = template
+            emails = utils.render_activation_emails(['key1', 'key2'], site)
+
+        days = utils.get_settings('REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS')
+        self.assertEqual(emails, [
+            ('key1%d %s' % (days, site.domain), 'key1\n%d %s' % (days, site.domain)),
+            ('key2%d %s' % (days, site.domain), 'key2\n%d %s' % (days, site.domain)),
+        ])
+
+    def test_get_cached_template(self):
+        utils.clear_cached_templates(setting='DEBUG')
+
+        with mock.patch('registration_api.utils.get_template') as mock_get_template:
+            template = utils.get_cached_template(utils.ACTIVATION_EMAIL_TEMPLATE)
+            self.assertIs(utils.get_cached_template(utils.ACTIVATION_EMAIL_TEMPLATE),
+                          template)
+            self.assertEqual(mock_get_template.call_count, 1)
+
+            with override_settings(DEBUG=True):
+                utils.get_cached_template(utils.ACTIVATION_EMAIL_TEMPLATE)
+                utils.get_cached_template(utils.ACTIVATION_EMAIL_TEMPLATE)
+            self.assertEqual(mock_get_template.call_count, 3)
+        utils.clear_cached_templates(setting='DEBUG')
+
     def test_get_settings(self):
         value = utils.get_settings('REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS')
 
@@ -177,59 +296,864 @@ class UtilsTests(TestCase):
                           'REGISTRATION_API_ACTIVATION_SUCCESS_URL')
 
 
+class AppSettingsTests(TestCase):
+
+    def test_defaults(self):
+        self.assertEqual(app_settings.ACCOUNT_ACTIVATION_DAYS,
+                         DEFAULTS['ACCOUNT_ACTIVATION_DAYS'])
+        self.assertEqual(app_settings.ACTIVATION_SUCCESS_URL,
+                         settings.REGISTRATION_API_ACTIVATION_SUCCESS_URL)
+
+    def test_setting_changed(self):
+        with override_settings(REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS=3):
+            self.assertEqual(app_settings.ACCOUNT_ACTIVATION_DAYS, 3)
+            self.assertEqual(utils.get_user_created_response_data(),
+                             {'activation_days': 3})
+        self.assertEqual(app_settings.ACCOUNT_ACTIVATION_DAYS,
+                         DEFAULTS['ACCOUNT_ACTIVATION_DAYS'])
+
+    def test_validate(self):
+        app_settings.validate()
+
+    @override_settings(REGISTRATION_API_ACTIVATION_SUCCESS_URL=None)
+    def test_validate_missing(self):
+        self.assertRaises(ImproperlyConfigured, app_settings.validate)
+
+    @override_settings(REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS='7')
+    def test_validate_invalid_type(self):
+        self.assertRaises(ImproperlyConfigured, app_settings.validate)
+
+    @override_settings(REGISTRATION_API_ACTIVATION_KEY_MODE='md5')
+    def test_validate_invalid_choice(self):
+        self.assertRaises(ImproperlyConfigured, app_settings.validate)
+
+    @override_settings(REGISTRATION_API_PROFILE_KEEP=0)
+    def test_validate_below_minimum(self):
+        self.assertRaises(ImproperlyConfigured, app_settings.validate)
+
+
+class PasswordHashingPoolTests(TestCase):
+
+    def test_no_pool(self):
+        self.assertIsNone(utils.get_password_hashing_pool())
+
+    @override_settings(REGISTRATION_API_PASSWORD_HASHING_POOL='thread',
+                       REGISTRATION_API_PASSWORD_HASHING_WORKERS=2)
+    def test_create_inactive_user(self):
+        pool = utils.get_password_hashing_pool()
+        self.assertIs(pool, utils.get_password_hashing_pool())
+
+        with mock.patch.object(pool, 'map', wraps=pool.map) as mock_map:
+            user = utils.create_inactive_user(**VALID_DATA)
+
+        self.assertTrue(mock_map.called)
+        user = get_user_model().objects.get(pk=user.pk)
+        self.assertTrue(user.check_password(VALID_DATA['password']))
+        self.assertFalse(user.is_active)
+
+    @override_settings(REGISTRATION_API_PASSWORD_HASHING_POOL='fork')
+    def test_invalid_pool(self):
+        self.assertRaises(ImproperlyConfigured,
+                          utils.get_password_hashing_pool)
+
+
+@override_settings(REGISTRATION_API_USE_EMAIL_OUTBOX=True,
+                   EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxTests(TestCase):
+
+    def test_create_inactive_user_queues_email(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+
+        queued = ActivationEmail.objects.get()
+        self.assertEqual(queued.email, user.email)
+        self.assertEqual(queued.activation_key,
+                         user.api_registration_profile.activation_key)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_queued_activation_emails(self):
+        utils.create_inactive_user(**VALID_DATA)
+
+        sent, failed = utils.send_queued_activation_emails()
+
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [VALID_DATA['email']])
+        queued = ActivationEmail.objects.get()
+        self.assertTrue(queued.sent)
+        self.assertEqual(queued.attempts, 1)
+        self.assertEqual(utils.send_queued_activation_emails(), (0, 0))
+
+    def test_send_queued_activation_emails_retry(self):
+        utils.create_inactive_user(**VALID_DATA)
+
+        with mock.patch('registration_api.utils.EmailMessage.send') as mock_send:
+            mock_send.side_effect = Exception('relay down')
+            sent, failed = utils.send_queued_activation_emails()
+
+        self.assertEqual((sent, failed), (0, 1))
+        queued = ActivationEmail.objects.get()
+        self.assertIsNone(queued.sent)
+        self.assertEqual(queued.attempts, 1)
+        self.assertIn('relay down', queued.last_error)
+        # Not due again until the backoff delay has passed.
+        self.assertEqual(utils.send_queued_activation_emails(), (0, 0))
+
+        ActivationEmail.objects.update(next_attempt=queued.created)
+        self.assertEqual(utils.send_queued_activation_emails(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(REGISTRATION_API_EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_send_queued_activation_emails_max_attempts(self):
+        utils.create_inactive_user(**VALID_DATA)
+        ActivationEmail.objects.update(attempts=1)
+
+        self.assertEqual(utils.send_queued_activation_emails(), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_send_activation_emails_command(self):
+        utils.create_inactive_user(**VALID_DATA)
+
+        call_command('send_activation_emails', verbosity=0)
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(ActivationEmail.objects.get().sent)
+
+    def test_purge_activation_emails(self):
+        for i in range(3):
+            utils.create_inactive_user(**dict(VALID_DATA, username='user%d' % i))
+        utils.send_queued_activation_emails(batch_size=1)
+        stale = ActivationEmail.objects.filter(sent__isnull=True)[0]
+        ActivationEmail.objects.filter(pk=stale.pk).update(
+            created=datetime_now() - datetime.timedelta(
+                days=app_settings.ACCOUNT_ACTIVATION_DAYS + 1))
+
+        self.assertEqual(utils.get_purgeable_activation_emails().count(), 2)
+        self.assertEqual(list(utils.purge_activation_emails(batch_size=1)), [1, 1])
+        remaining = ActivationEmail.objects.get()
+        self.assertIsNone(remaining.sent)
+        self.assertNotEqual(remaining.pk, stale.pk)
+
+    def test_purge_expired_registrations_command_purges_sent_emails(self):
+        utils.create_inactive_user(**VALID_DATA)
+        utils.send_queued_activation_emails()
+
+        stdout = StringIO()
+        call_command('purge_expired_registrations', dry_run=True, stdout=stdout)
+        self.assertIn('1 activation emails would be deleted.', stdout.getvalue())
+        self.assertTrue(ActivationEmail.objects.exists())
+
+        call_command('purge_expired_registrations', verbosity=0)
+
+        self.assertFalse(ActivationEmail.objects.exists())
+
+
+@override_settings(REGISTRATION_API_ACTIVATION_KEY_MODE='signed')
+class SignedActivationKeyTests(TestCase):
+
+    def test_create_activation_key(self):
+        user = get_user_model().objects.create(**VALID_DATA)
+
+        activation_key = utils.create_activation_key(user)
+
+        self.assertTrue(utils.SIGNED_KEY_RE.search(activation_key))
+        self.assertTrue(len(activation_key) <= 40)
+        self.assertEqual(utils.check_signed_activation_key(activation_key),
+                         user.pk)
+
+    def test_activate_user(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+
+        user = utils.activate_user(user.api_registration_profile.activation_key)
+
+        self.assertTrue(user.is_active)
+
+    def test_activate_user_tampered(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+        tampered = '2' + activation_key[1:]
+        if tampered == activation_key:
+            tampered = '3' + activation_key[1:]
+
+        with self.assertNumQueries(0):
+            self.assertFalse(utils.activate_user(tampered))
+
+    def test_activate_user_expired(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+        days = utils.get_settings('REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS')
+        expired = time.time() + days * 86400 + 1
+
+        with mock.patch('registration_api.utils.time.time') as mock_time:
+            mock_time.return_value = expired
+            with self.assertNumQueries(0):
+                self.assertFalse(utils.activate_user(activation_key))
+
+    def test_activate_user_sha1_key(self):
+        with override_settings(REGISTRATION_API_ACTIVATION_KEY_MODE='sha1'):
+            user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+
+        self.assertTrue(utils.SHA1_RE.search(activation_key))
+        self.assertTrue(utils.activate_user(activation_key))
+
+
+class ActivationKeyTests(TestCase):
+
+    def test_random_key_generator(self):
+        generator = keys.RandomKeyGenerator()
+
+        activation_key = generator.generate(None)
+
+        self.assertTrue(utils.SHA1_RE.search(activation_key))
+        self.assertNotEqual(activation_key, generator.generate(None))
+
+    @override_settings(
+        REGISTRATION_API_ACTIVATION_KEY_GENERATOR='registration_api.keys.SHA1KeyGenerator')
+    def test_key_generator_setting(self):
+        self.assertIsInstance(keys.get_key_generator(), keys.SHA1KeyGenerator)
+        user = utils.create_inactive_user(**VALID_DATA)
+
+        self.assertTrue(utils.SHA1_RE.search(
+            user.api_registration_profile.activation_key))
+
+    def test_compact_key(self):
+        activation_key = keys.RandomKeyGenerator().generate(None)
+
+        compact = keys.compact_key(activation_key)
+
+        self.assertEqual(len(compact), 27)
+        self.assertEqual(keys.expand_key(compact), activation_key)
+
+    @override_settings(REGISTRATION_API_COMPACT_ACTIVATION_KEYS=True,
+                       REGISTRATION_API_USE_EMAIL_OUTBOX=True)
+    def test_compact_storage(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        profile = RegistrationProfile.objects.get(user=user)
+        activation_key = profile.get_activation_key()
+
+        self.assertEqual(profile.activation_key, '')
+        self.assertEqual(profile.compact_key, keys.compact_key(activation_key))
+        self.assertEqual(ActivationEmail.objects.get().activation_key, activation_key)
+        with CaptureStatements() as captured:
+            self.assertTrue(utils.activate_user(activation_key))
+        self.assertEqual(len(captured.statements), 3)
+
+    def test_compact_storage_turned_off(self):
+        with override_settings(REGISTRATION_API_COMPACT_ACTIVATION_KEYS=True):
+            user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = RegistrationProfile.objects.get(user=user).get_activation_key()
+
+        self.assertTrue(utils.activate_user(activation_key))
+
+    def test_compact_storage_legacy_keys(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+
+        with override_settings(REGISTRATION_API_COMPACT_ACTIVATION_KEYS=True):
+            self.assertTrue(utils.activate_user(activation_key))
+
+
+@override_settings(REGISTRATION_API_ACTIVATION_FAILURE_CACHE_TTL=60)
+class ActivationFailureCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+
+    def test_failure_cached(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+        self.assertTrue(utils.activate_user(activation_key))
+
+        self.assertFalse(utils.activate_user(activation_key))
+        with self.assertNumQueries(0):
+            self.assertFalse(utils.activate_user(activation_key))
+            self.assertFalse(utils.activate_user(activation_key))
+
+        counters = metrics.registry.counters
+        self.assertEqual(counters['activate_user.failure_cache', 'miss'], 2)
+        self.assertEqual(counters['activate_user.failure_cache', 'hit'], 2)
+
+    def test_unknown_key(self):
+        activation_key = '0' * 40
+
+        self.assertFalse(utils.activate_user(activation_key))
+        with self.assertNumQueries(0):
+            self.assertFalse(utils.activate_user(activation_key))
+
+    def test_success_not_cached(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+
+        self.assertTrue(utils.activate_user(activation_key))
+        self.assertIsNone(cache.get(utils.ACTIVATION_FAILURE_CACHE_FORMAT % activation_key))
+
+    @override_settings(REGISTRATION_API_ACTIVATION_FAILURE_CACHE_TTL=0)
+    def test_disabled(self):
+        self.assertFalse(utils.activate_user('0' * 40))
+        with self.assertNumQueries(1):
+            self.assertFalse(utils.activate_user('0' * 40))
+
+
+class PurgeExpiredRegistrationsTests(TestCase):
+
+    def create_users(self, count, expired=False):
+        users = []
+        for i in range(count):
+            data = dict(VALID_DATA, username='%s%d' % (
+                VALID_DATA['username'], get_user_model().objects.count()))
+            users.append(utils.create_inactive_user(**data))
+        if expired:
+            self.expire(users)
+        return users
+
+    def expire(self, users):
+        RegistrationProfile.objects.filter(user__in=users).update(
+            expires_at=datetime_now() - datetime.timedelta(seconds=1))
+
+    def test_expired(self):
+        self.create_users(1)
+        expired = self.create_users(1, expired=True)
+        activated = self.create_users(1)
+        utils.activate_user(activated[0].api_registration_profile.activation_key)
+        self.expire(activated)
+
+        self.assertEqual(
+            list(RegistrationProfile.objects.expired().values_list('user', flat=True)),
+            [expired[0].pk])
+
+    def test_expired_skips_user_table(self):
+        query = str(RegistrationProfile.objects.expired().query)
+
+        self.assertNotIn(get_user_model()._meta.db_table, query)
+
+    def test_activate_expired(self):
+        user = self.create_users(1, expired=True)[0]
+        activation_key = user.api_registration_profile.activation_key
+
+        self.assertFalse(utils.activate_user(activation_key))
+        profile = RegistrationProfile.objects.get(user=user)
+        self.assertEqual(profile.state, RegistrationProfile.EXPIRED)
+        self.assertEqual(list(RegistrationProfile.objects.expired()), [profile])
+
+    def test_purge_expired_registrations(self):
+        pending = self.create_users(1)
+        self.create_users(3, expired=True)
+
+        deleted = list(utils.purge_expired_registrations(batch_size=2))
+
+        self.assertEqual(deleted, [2, 1])
+        self.assertEqual(list(get_user_model().objects.all()), pending)
+        self.assertEqual(RegistrationProfile.objects.count(), 1)
+
+    def test_purge_keeps_active_users(self):
+        active = self.create_users(2, expired=True)
+        get_user_model().objects.update(is_active=True)
+        self.create_users(1, expired=True)
+
+        self.assertEqual(utils.count_expired_registrations(), 1)
+        deleted = list(utils.purge_expired_registrations(batch_size=1))
+
+        self.assertEqual(sum(deleted), 1)
+        self.assertEqual(list(get_user_model().objects.all()), active)
+        self.assertFalse(RegistrationProfile.objects.expired().exists())
+
+    def test_command(self):
+        self.create_users(2, expired=True)
+
+        call_command('purge_expired_registrations', batch_size=1, verbosity=0)
+
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_command_dry_run(self):
+        self.create_users(2, expired=True)
+
+        stdout = StringIO()
+
+        call_command('purge_expired_registrations', dry_run=True, stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), '2 expired registrations would be deleted.\n'
+                                            '0 activation emails would be deleted.\n')
+        self.assertEqual(get_user_model().objects.count(), 2)
+
+
+@override_settings(REGISTRATION_API_DEFER_USER_CREATION=True,
+                   REGISTRATION_API_USE_EMAIL_OUTBOX=True)
+class DeferredRegistrationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def get_activation_key(self):
+        return ActivationEmail.objects.latest('pk').activation_key
+
+    def test_register(self):
+        response = self.client.post(reverse('registration_api_register'), VALID_DATA)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(get_user_model().objects.exists())
+        pending = PendingRegistration.objects.get()
+        self.assertEqual(pending.username, VALID_DATA['username'])
+        self.assertEqual(pending.get_activation_key(), self.get_activation_key())
+
+    def test_activate(self):
+        utils.create_inactive_user(**VALID_DATA)
+        activation_key = self.get_activation_key()
+
+        with CaptureStatements() as captured:
+            user = utils.activate_user(activation_key)
+
+        self.assertEqual(len(captured.statements), 4)
+        self.assertTrue(user.is_active)
+        self.assertTrue(user.check_password(VALID_DATA['password']))
+        self.assertEqual(user.api_registration_profile.state, RegistrationProfile.ACTIVE)
+        self.assertFalse(PendingRegistration.objects.exists())
+        self.assertFalse(utils.activate_user(activation_key))
+
+    def test_activate_expired(self):
+        utils.create_inactive_user(**VALID_DATA)
+        PendingRegistration.objects.update(
+            expires_at=datetime_now() - datetime.timedelta(seconds=1))
+
+        self.assertFalse(utils.activate_user(self.get_activation_key()))
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_unique_against_pending(self):
+        utils.create_inactive_user(**VALID_DATA)
+        serializer = RegistrationSerializer(data=VALID_DATA)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('username', serializer.errors)
+
+    def test_replace_expired(self):
+        utils.create_inactive_user(**VALID_DATA)
+        PendingRegistration.objects.update(
+            expires_at=datetime_now() - datetime.timedelta(seconds=1))
+
+        self.assertTrue(RegistrationSerializer(data=VALID_DATA).is_valid())
+        utils.create_inactive_user(**VALID_DATA)
+        self.assertTrue(utils.activate_user(self.get_activation_key()))
+
+    def test_bulk_replace_expired(self):
+        utils.create_inactive_user(**VALID_DATA)
+        PendingRegistration.objects.update(
+            expires_at=datetime_now() - datetime.timedelta(seconds=1))
+
+        utils.create_inactive_users([VALID_DATA])
+
+        self.assertFalse(PendingRegistration.objects.get().activation_key_expired())
+
+    def test_purge_expired(self):
+        utils.create_inactive_user(**VALID_DATA)
+        PendingRegistration.objects.update(
+            expires_at=datetime_now() - datetime.timedelta(seconds=1))
+
+        self.assertEqual(list(utils.purge_expired_registrations()), [1])
+        self.assertFalse(PendingRegistration.objects.exists())
+
+    @override_settings(REGISTRATION_API_USER_FILTER={'capacity': 1000, 'error_rate': 0.01})
+    def test_user_filter_not_trusted(self):
+        user_filter.clear()
+        self.addCleanup(user_filter.clear)
+        user_filter.warm()
+        # Activated by another process: this process's filter missed it.
+        get_user_model().objects.bulk_create([get_user_model()(**VALID_DATA)])
+
+        response = self.client.post(reverse('registration_api_register'), VALID_DATA)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('username', response.data)
+        self.assertFalse(PendingRegistration.objects.exists())
+
+    def test_stage_pending_registrations_dry_run(self):
+        with override_settings(REGISTRATION_API_DEFER_USER_CREATION=False):
+            utils.create_inactive_user(**VALID_DATA)
+        stdout = StringIO()
+
+        call_command('stage_pending_registrations', dry_run=True, stdout=stdout)
+        call_command('stage_pending_registrations', dry_run=True, verbosity=0, stdout=stdout)
+
+        self.assertEqual(stdout.getvalue(), '1 pending registrations may be moved.\n')
+        self.assertFalse(PendingRegistration.objects.exists())
+
+    def test_stage_pending_registrations(self):
+        with override_settings(REGISTRATION_API_DEFER_USER_CREATION=False):
+            user = utils.create_inactive_user(**VALID_DATA)
+            activated = utils.create_inactive_user(
+                **dict(VALID_DATA, username='activated', email='activated@example.com'))
+            utils.activate_user(activated.api_registration_profile.activation_key)
+        activation_key = user.api_registration_profile.activation_key
+
+        call_command('stage_pending_registrations', batch_size=1, verbosity=0)
+
+        self.assertEqual(list(get_user_model().objects.all()), [activated])
+        self.assertEqual(PendingRegistration.objects.get().get_activation_key(),
+                         activation_key)
+        self.assertTrue(utils.activate_user(activation_key).check_password(
+            VALID_DATA['password']))
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.users = []
+        for i in range(3):
+            self.users.append(utils.create_inactive_user(
+                **dict(VALID_DATA, username='user%d' % i)))
+        utils.activate_user(self.users[0].api_registration_profile.activation_key)
+
+    def test_csv(self):
+        out = StringIO()
+
+        call_command('export_registrations', chunk_size=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'user_id', 'username'])
+        self.assertEqual([line.split(',')[2] for line in lines[1:]], ['user1', 'user2'])
+        self.assertTrue(all(line.split(',')[4] == 'pending' for line in lines[1:]))
+
+    def test_jsonl(self):
+        out = StringIO()
+
+        call_command('export_registrations', format='jsonl', state='pending', stdout=out)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([row['username'] for row in rows], ['user1', 'user2'])
+        self.assertEqual(rows[0]['user_id'], self.users[1].pk)
+
+    def test_chunks(self):
+        queryset = RegistrationProfile.objects.all()
+
+        # A chunk of profiles and their users, twice.
+        with self.assertNumQueries(4):
+            lines = list(export_registrations(queryset, 'jsonl', chunk_size=2))
+        self.assertEqual(len(lines), 3)
+
+    def test_admin_action(self):
+        queryset = RegistrationProfile.objects.exclude(state=RegistrationProfile.ACTIVE)
+
+        response = admin.export_csv(None, MockHttpRequest(), queryset)
+
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+
+@override_settings(REGISTRATION_API_TRACK_STATS=True)
+class RegistrationStatsTests(TestCase):
+
+    def setUp(self):
+        users = [utils.create_inactive_user(**dict(VALID_DATA, username='user%d' % i))
+                 for i in range(2)]
+        utils.activate_user(users[0].api_registration_profile.activation_key)
+        self.today = utils.stats_date(datetime_now())
+        self.expiry = utils.stats_date(users[1].api_registration_profile.expires_at)
+
+    def get_counts(self):
+        return list(RegistrationStats.objects.values_list(
+            'date', 'registered', 'activated', 'expired'))
+
+    def test_counters(self):
+        self.assertEqual(self.get_counts(), [(self.expiry, 0, 0, 1),
+                                             (self.today, 2, 1, 0)])
+
+    def test_rebuild(self):
+        counts = self.get_counts()
+        RegistrationStats.objects.update(registered=0)
+
+        call_command('rebuild_registration_stats', verbosity=0)
+
+        self.assertEqual(self.get_counts(), counts)
+
+    def test_view(self):
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('registration_api_stats'), {'days': 7})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(response.data['days'], [{
+            'date': self.today, 'registered': 2, 'activated': 1, 'expired': 0,
+            'activation_rate': 0.5}])
+        self.assertEqual(response.data['totals']['registered'], 2)
+
+    def test_view_staff_only(self):
+        response = self.client.get(reverse('registration_api_stats'))
+
+        self.assertEqual(403, response.status_code)
+
+
+@override_settings(REGISTRATION_API_DATABASE='registration')
+class RegistrationRouterTests(TestCase):
+    multi_db = True
+
+    def test_router(self):
+        router = RegistrationRouter()
+        user = get_user_model()(pk=1)
+
+        self.assertEqual(router.db_for_write(RegistrationProfile), 'registration')
+        self.assertEqual(router.db_for_read(ActivationEmail), 'registration')
+        self.assertIsNone(router.db_for_read(get_user_model()))
+        self.assertTrue(router.allow_relation(RegistrationProfile(), user))
+        self.assertFalse(router.allow_relation(RegistrationProfile(), Site()))
+        self.assertTrue(router.allow_syncdb('registration', RegistrationStats))
+        self.assertFalse(router.allow_syncdb('default', ActivationEmail))
+        self.assertTrue(router.allow_syncdb('default', RegistrationProfile))
+        self.assertFalse(router.allow_syncdb('replica', RegistrationProfile))
+        self.assertIsNone(router.allow_syncdb('registration', get_user_model()))
+
+    def test_create_inactive_user(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+
+        self.assertTrue(get_user_model().objects.using('default').filter(pk=user.pk).exists())
+        self.assertFalse(get_user_model().objects.using('registration').exists())
+        self.assertTrue(RegistrationProfile.objects.using('registration').filter(
+            user_id=user.pk).exists())
+        self.assertFalse(RegistrationProfile.objects.using('default').exists())
+
+    @mock.patch('registration_api.utils.send_activation_email', side_effect=RuntimeError)
+    def test_create_inactive_user_rollback(self, mock_send):
+        self.assertRaises(RuntimeError, utils.create_inactive_user, **VALID_DATA)
+
+        self.assertFalse(get_user_model().objects.using('default').exists())
+        self.assertFalse(RegistrationProfile.objects.using('registration').exists())
+
+    def test_activate_user(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        activation_key = user.api_registration_profile.activation_key
+
+        with CaptureStatements(connections['registration']) as registration:
+            with CaptureStatements(connections['default']) as default:
+                user = utils.activate_user(activation_key)
+
+        self.assertTrue(user.is_active)
+        self.assertTrue(get_user_model().objects.get(pk=user.pk).is_active)
+        # The profile lookup and update, the user update and lookup.
+        self.assertEqual(len(registration.statements), 2)
+        self.assertEqual(len(default.statements), 2)
+
+    @override_settings(REGISTRATION_API_READ_DATABASE='replica')
+    def test_activate_user_replica(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        profile = user.api_registration_profile
+        profile.save(using='replica')
+
+        with CaptureStatements(connections['replica']) as replica:
+            with CaptureStatements(connections['registration']) as registration:
+                self.assertTrue(utils.activate_user(profile.activation_key))
+
+        self.assertEqual(len(replica.statements), 1)
+        self.assertEqual(len(registration.statements), 1)
+        self.assertEqual(RegistrationProfile.objects.using('registration').get().state,
+                         RegistrationProfile.ACTIVE)
+
+    @override_settings(REGISTRATION_API_READ_DATABASE='replica')
+    def test_activate_user_replica_lag(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+
+        self.assertTrue(utils.activate_user(user.api_registration_profile.activation_key))
+
+    def test_purge_expired_registrations(self):
+        user = utils.create_inactive_user(**VALID_DATA)
+        RegistrationProfile.objects.update(
+            expires_at=datetime_now() - datetime.timedelta(seconds=1))
+
+        self.assertEqual(list(utils.purge_expired_registrations()), [1])
+        self.assertFalse(get_user_model().objects.filter(pk=user.pk).exists())
+        self.assertFalse(RegistrationProfile.objects.exists())
+
+
 class UserSerializerTests(TestCase):
 
     def test_model(self):
         self.assertEqual(UserSerializer.Meta.model, get_user_model())
 
 
+class RegistrationSerializerTests(TestCase):
+
+    def test_fields(self):
+        serializer = RegistrationSerializer()
+
+        self.assertEqual(sorted(serializer.fields),
+                         sorted(['password', 'email', get_user_model().USERNAME_FIELD]))
+
+    def test_valid(self):
+        serializer = RegistrationSerializer(data=dict(VALID_DATA, is_staff=True))
+
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.object, VALID_DATA)
+
+    def test_invalid(self):
+        serializer = RegistrationSerializer(data=INVALID_DATA)
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('password', serializer.errors)
+
+    def test_model_validators(self):
+        serializer = RegistrationSerializer(data=dict(VALID_DATA, username='bad name!!'))
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('username', serializer.errors)
+
+    def test_password_max_length(self):
+        serializer = RegistrationSerializer(data=dict(VALID_DATA, password='x' * 4097))
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('password', serializer.errors)
+
+    def test_unique_single_query(self):
+        get_user_model().objects.create(**VALID_DATA)
+        serializer = RegistrationSerializer(data=VALID_DATA)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        self.assertIn(get_user_model().USERNAME_FIELD, serializer.errors)
+
+
+@override_settings(REGISTRATION_API_USER_FILTER={'capacity': 1000, 'error_rate': 0.01})
+class UserFilterTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        user_filter.clear()
+
+    def tearDown(self):
+        user_filter.clear()
+
+    def test_bloom_filter(self):
+        bloom_filter = BloomFilter(1000, 0.01)
+        bloom_filter.add(u'username:alice')
+
+        self.assertIn(u'username:alice', bloom_filter)
+        self.assertNotIn(u'username:bob', bloom_filter)
+        self.assertIn(u'username:alice', BloomFilter(1000, 0.01, bytes(bloom_filter.bits)))
+
+    def test_free_values_skip_query(self):
+        user_filter.warm()
+        serializer = RegistrationSerializer(data=VALID_DATA)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(serializer.is_valid())
+
+    def test_saved_users_are_added(self):
+        user_filter.warm()
+        get_user_model().objects.create(**VALID_DATA)
+        serializer = RegistrationSerializer(data=VALID_DATA)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+        self.assertIn(get_user_model().USERNAME_FIELD, serializer.errors)
+
+    def test_not_warmed(self):
+        serializer = RegistrationSerializer(data=VALID_DATA)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertIsNone(user_filter.bloom_filter)
+
+    def test_stale_cache_ignored(self):
+        user_filter.warm()
+        user_filter.clear()
+
+        with override_settings(REGISTRATION_API_USER_FILTER={'capacity': 100000,
+                                                            'error_rate': 0.01}):
+            self.assertTrue(user_filter.might_contain('username', 'alice'))
+            self.assertIsNone(user_filter.bloom_filter)
+
+    def test_warm_too_large(self):
+        with mock.patch.object(cache, 'set'):
+            self.assertRaises(CommandError, call_command, 'warm_registration_filter',
+                              verbosity=0)
+
+    @override_settings(REGISTRATION_API_USER_FILTER=False)
+    def test_disabled(self):
+        serializer = RegistrationSerializer(data=VALID_DATA)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+        self.assertIsNone(user_filter.bloom_filter)
+
+    def test_missed_duplicate(self):
+        user_filter.warm()
+        # bulk_create sends no post_save, as a user registered by another
+        # process, so the filter does not know it.
+        get_user_model().objects.bulk_create([get_user_model()(**VALID_DATA)])
+        url = reverse('registration_api_register')
+
+        response = self.client.post(url, VALID_DATA)
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn(get_user_model().USERNAME_FIELD, response.data)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_missed_duplicate_bulk(self):
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        user_filter.warm()
+        get_user_model().objects.bulk_create([get_user_model()(**VALID_DATA)])
+        users_data = [VALID_DATA, dict(VALID_DATA, username='other')]
+
+        response = self.client.post(reverse('registration_api_register_bulk'),
+                                    json.dumps(users_data), content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([e['index'] for e in response.data['errors']], [0])
+
+    def test_warm_command(self):
+        get_user_model().objects.create(**VALID_DATA)
+
+        call_command('warm_registration_filter', verbosity=0)
+        user_filter.clear()
+
+        with self.assertNumQueries(0):
+            self.assertTrue(user_filter.might_contain(
+                get_user_model().USERNAME_FIELD, VALID_DATA['username']))
+        self.assertTrue(cache.get(CACHE_KEY))
+
+
 class RegisterAPIViewTests(TestCase):
 
-    @mock.patch('registration_api.utils.get_user_data')
+    def setUp(self):
+        cache.clear()
+
     @mock.patch('registration_api.utils.create_inactive_user')
-    @mock.patch('registration_api.views.UserSerializer')
+    @mock.patch('registration_api.views.RegistrationSerializer')
     @mock.patch('registration_api.views.Response')
-    def test_valid_registration(self, mock_Response, mock_UserSerializer, mock_create_incative_user, mock_get_user_data):
-        created_user = 'user'
+    def test_valid_registration(self, mock_Response, mock_RegistrationSerializer, mock_create_incative_user):
         mock_Response.return_value = Response()
-        mock_userserializer_instance = mock.Mock()
-        mock_userserializer_instance.data = VALID_DATA
-        mock_UserSerializer.return_value = mock_userserializer_instance
-        mock_userserializer_instance.is_valid.return_value = True
-        mock_create_user = mock.Mock()
-        mock_create_user.return_value = created_user
-        mock_objects = mock.Mock()
-        mock_objects.create_user = mock_create_user
-        mock_user_model = mock.Mock()
-        mock_user_model.objects = mock_objects
-        mock_get_user_data.return_value = VALID_DATA
+        mock_serializer_instance = mock.Mock()
+        mock_serializer_instance.object = VALID_DATA
+        mock_RegistrationSerializer.return_value = mock_serializer_instance
+        mock_serializer_instance.is_valid.return_value = True
 
         request = MockHttpRequest(POST=VALID_DATA)
 
         register(request)
 
-        mock_UserSerializer.assert_called_with(data=VALID_DATA)
+        mock_RegistrationSerializer.assert_called_with(data=VALID_DATA)
         mock_Response.assert_called_with(
-            utils.USER_CREATED_RESPONSE_DATA,
+            utils.get_user_created_response_data(),
             status=status.HTTP_201_CREATED)
         mock_create_incative_user.assert_called_with(**VALID_DATA)
 
-    @mock.patch('registration_api.views.UserSerializer')
+    @mock.patch('registration_api.views.RegistrationSerializer')
     @mock.patch('registration_api.views.Response')
-    def test_invalid_registration(self, mock_Response, mock_UserSerializer):
+    def test_invalid_registration(self, mock_Response, mock_RegistrationSerializer):
         mock_Response.return_value = Response()
-        mock_userserializer_instance = mock.Mock()
-        mock_UserSerializer.return_value = mock_userserializer_instance
-        mock_userserializer_instance.is_valid.return_value = False
-        mock_userserializer_instance._errors = {}
+        mock_serializer_instance = mock.Mock()
+        mock_RegistrationSerializer.return_value = mock_serializer_instance
+        mock_serializer_instance.is_valid.return_value = False
+        mock_serializer_instance._errors = {}
 
         request = MockHttpRequest(POST=VALID_DATA)
 
         register(request)
 
-        mock_UserSerializer.assert_called_with(data=VALID_DATA)
+        mock_RegistrationSerializer.assert_called_with(data=VALID_DATA)
         mock_Response.assert_called_with(
-            mock_userserializer_instance._errors,
+            mock_serializer_instance._errors,
             status=status.HTTP_400_BAD_REQUEST)
 
     def test_functional(self):
@@ -242,6 +1166,38 @@ class RegisterAPIViewTests(TestCase):
         self.assertFalse(get_user_model().objects.get().is_active)
         self.assertTrue(RegistrationProfile.objects.get())
 
+    def test_functional_num_queries(self):
+        url = reverse('registration_api_register')
+        Site.objects.get_current()
+
+        with CaptureStatements() as captured:
+            response = self.client.post(url, VALID_DATA)
+
+        self.assertEqual(201, response.status_code)
+        # The uniqueness check, the user and its profile.
+        self.assertEqual(len(captured.statements), 3)
+
+    def test_functional_json(self):
+        url = reverse('registration_api_register')
+
+        response = self.client.post(url, json.dumps(VALID_DATA),
+                                    content_type='application/json')
+
+        self.assertEqual(201, response.status_code)
+        user = get_user_model().objects.get()
+        self.assertFalse(user.is_active)
+        self.assertTrue(user.check_password(VALID_DATA['password']))
+
+    def test_functional_duplicate(self):
+        url = reverse('registration_api_register')
+        self.client.post(url, VALID_DATA)
+
+        response = self.client.post(url, VALID_DATA)
+
+        self.assertEqual(400, response.status_code)
+        self.assertIn('username', response.data)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
     def test_functional_invalid(self):
         url = reverse('registration_api_register')
 
@@ -251,8 +1207,170 @@ class RegisterAPIViewTests(TestCase):
         self.assertFalse(get_user_model().objects.filter())
 
 
+class IdempotencyTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('registration_api_register')
+
+    def post(self, data, key='retry-1'):
+        return self.client.post(self.url, data, HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        first = self.post(VALID_DATA)
+
+        with mock.patch('registration_api.utils.create_inactive_user') as mock_create:
+            with self.assertNumQueries(0):
+                retry = self.post(VALID_DATA)
+
+        self.assertFalse(mock_create.called)
+        self.assertEqual(retry.status_code, first.status_code)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_other_key(self):
+        self.post(VALID_DATA)
+
+        response = self.post(VALID_DATA, key='retry-2')
+
+        self.assertEqual(400, response.status_code)
+
+    def test_different_data(self):
+        self.post(VALID_DATA)
+
+        response = self.post(dict(VALID_DATA, username='other'))
+
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    @override_settings(REGISTRATION_API_IDEMPOTENCY_WAIT=0)
+    def test_in_progress(self):
+        cache_key = idempotency.CACHE_FORMAT % {
+            'scope': 'register', 'key': hashlib.md5('retry-1').hexdigest()}
+        cache.set(cache_key, {'fingerprint': 'pending'})
+
+        response = self.post(VALID_DATA)
+
+        self.assertEqual(409, response.status_code)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(get_user_model().objects.exists())
+
+    @mock.patch('registration_api.utils.create_inactive_user', side_effect=RuntimeError)
+    def test_error_not_stored(self, mock_create):
+        self.assertRaises(RuntimeError, self.post, VALID_DATA)
+        mock_create.side_effect = None
+
+        response = self.post(VALID_DATA)
+
+        self.assertEqual(201, response.status_code)
+
+    @override_settings(REGISTRATION_API_IDEMPOTENCY_TTL=0)
+    def test_disabled(self):
+        self.post(VALID_DATA)
+
+        response = self.post(VALID_DATA)
+
+        self.assertEqual(400, response.status_code)
+
+
+class RegisterBulkViewTests(TestCase):
+
+    def setUp(self):
+        get_user_model().objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        self.url = reverse('registration_api_register_bulk')
+
+    def post(self, data):
+        return self.client.post(self.url, json.dumps(data),
+                                content_type='application/json')
+
+    def test_register_bulk(self):
+        users_data = [dict(VALID_DATA, username='john%d' % i) for i in range(3)]
+        users_data.append(INVALID_DATA)
+        users_data.append(users_data[0])
+
+        response = self.post(users_data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual([e['index'] for e in response.data['errors']], [3, 4])
+        self.assertIn('password', response.data['errors'][0]['errors'])
+        users = get_user_model().objects.filter(is_active=False)
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(RegistrationProfile.objects.count(), 3)
+        self.assertTrue(users[0].check_password(VALID_DATA['password']))
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_register_bulk_num_queries(self):
+        def count_queries(count, prefix):
+            users_data = [dict(VALID_DATA, username='%s%d' % (prefix, i),
+                               email='%s%d@example.com' % (prefix, i))
+                          for i in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.post(users_data).data['created'], count)
+            return len(captured)
+
+        self.assertEqual(count_queries(2, 'a'), count_queries(10, 'b'))
+
+    def test_bulk_unique_errors(self):
+        get_user_model().objects.create(**VALID_DATA)
+        users_data = [VALID_DATA, dict(VALID_DATA, username='new'),
+                      dict(VALID_DATA, username='new')]
+
+        with self.assertNumQueries(1):
+            errors = get_bulk_unique_errors(users_data)
+
+        self.assertEqual([sorted(e) for e in errors], [['username'], [], ['username']])
+
+    def test_register_bulk_concurrent_duplicate(self):
+        def create_inactive_users(users_data):
+            get_user_model().objects.create(**VALID_DATA)
+            raise IntegrityError
+
+        with mock.patch.object(utils, 'create_inactive_users', create_inactive_users):
+            response = self.post([dict(VALID_DATA, username='other'), VALID_DATA])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual([e['index'] for e in response.data['errors']], [1])
+
+    def test_register_bulk_invalid(self):
+        response = self.post([INVALID_DATA])
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['created'], 0)
+
+    def test_register_bulk_not_a_list(self):
+        response = self.post(VALID_DATA)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_register_bulk_requires_admin(self):
+        self.client.logout()
+
+        response = self.post([VALID_DATA])
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(REGISTRATION_API_USE_EMAIL_OUTBOX=True)
+    def test_create_inactive_users_outbox(self):
+        users = utils.create_inactive_users(
+            [dict(VALID_DATA, username='john%d' % i) for i in range(3)])
+
+        self.assertEqual(ActivationEmail.objects.count(), 3)
+        self.assertEqual(
+            set(ActivationEmail.objects.values_list('activation_key', flat=True)),
+            set(RegistrationProfile.objects.values_list('activation_key', flat=True)))
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(all(u.pk for u in users))
+
+
 class ActivateViewTests(TestCase):
 
+    def setUp(self):
+        cache.clear()
+
     def test_activate(self):
         user = utils.create_inactive_user(**VALID_DATA)
         request = MockHttpRequest()
@@ -263,8 +1381,8 @@ class ActivateViewTests(TestCase):
         user = get_user_model().objects.get(pk=user.pk)
 
         self.assertTrue(user.is_active)
-        self.assertEqual(user.api_registration_profile.activation_key,
-                         RegistrationProfile.ACTIVATED)
+        self.assertEqual(user.api_registration_profile.state,
+                         RegistrationProfile.ACTIVE)
         self.assertEqual(response.status_code,
                          status.HTTP_302_FOUND)
         self.assertEqual(response['location'],
@@ -280,3 +1398,219 @@ class ActivateViewTests(TestCase):
             activate,
             request,
             activation_key=user.api_registration_profile.activation_key)
+
+
+@override_settings(REGISTRATION_API_THROTTLE_RATES={
+    'register_ip': '3/min', 'register_email': '2/min', 'activate_ip': '2/min'})
+class ThrottlingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('registration_api_register')
+        # Frozen at the start of a period, so requests are never counted
+        # in two buckets.
+        patcher = mock.patch.object(CacheBucketThrottle, 'timer', return_value=3600.0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def register(self, **data):
+        return self.client.post(self.url, dict(VALID_DATA, **data))
+
+    def test_register_ip(self):
+        for i in range(3):
+            response = self.register(username='john%d' % i, email='john%d@example.com' % i)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.register(username='jane', email='jane@example.com')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(get_user_model().objects.filter(username='jane').exists())
+
+    def test_register_email(self):
+        self.register(username='john0', email='John@example.com')
+        self.register(username='john1', email='john@example.com ')
+
+        response = self.register(username='john2', email='JOHN@example.com',
+                                 REMOTE_ADDR='10.0.0.1')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_activate_ip(self):
+        url = reverse('registration_activate', kwargs={'activation_key': 'a' * 40})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_302_FOUND)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_302_FOUND)
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60)
+
+    def test_disabled(self):
+        with override_settings(REGISTRATION_API_THROTTLE_RATES={}):
+            for i in range(4):
+                response = self.register(username='john%d' % i)
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_proxy_count(self):
+        throttle = RegisterIPThrottle()
+        request = MockHttpRequest()
+        request.META['HTTP_X_FORWARDED_FOR'] = '1.2.3.4, 10.0.0.2, 10.0.0.3'
+
+        self.assertEqual(throttle.get_ident(request), request.META['REMOTE_ADDR'])
+        with override_settings(REGISTRATION_API_THROTTLE_PROXY_COUNT=1):
+            self.assertEqual(throttle.get_ident(request), '10.0.0.3')
+        with override_settings(REGISTRATION_API_THROTTLE_PROXY_COUNT=3):
+            self.assertEqual(throttle.get_ident(request), '1.2.3.4')
+        with override_settings(REGISTRATION_API_THROTTLE_PROXY_COUNT=5):
+            self.assertEqual(throttle.get_ident(request), '1.2.3.4')
+
+    def test_period(self):
+        throttle = RegisterIPThrottle()
+        request = MockHttpRequest()
+        with mock.patch.object(throttle, 'timer', return_value=120.0):
+            self.assertTrue(all(throttle.allow_request(request, None) for i in range(3)))
+            self.assertFalse(throttle.allow_request(request, None))
+            self.assertEqual(throttle.wait(), 60)
+        with mock.patch.object(throttle, 'timer', return_value=180.0):
+            self.assertTrue(throttle.allow_request(request, None))
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+
+    def test_timer(self):
+        with metrics.timer('operation'):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.timer('operation'):
+                raise ValueError
+
+        self.assertEqual(metrics.registry.counters, {
+            ('operation', 'success'): 1, ('operation', 'failure'): 1})
+        self.assertEqual(metrics.registry.timers['operation'][0], 2)
+
+    def test_timed(self):
+        decorated = metrics.timed('operation')(lambda value: value)
+
+        self.assertEqual(decorated(1), 1)
+        self.assertFalse(decorated(False))
+
+        self.assertEqual(metrics.registry.counters, {
+            ('operation', 'success'): 1, ('operation', 'failure'): 1})
+
+    def test_pipeline(self):
+        self.client.post(reverse('registration_api_register'), VALID_DATA)
+        user = get_user_model().objects.get()
+        utils.activate_user(user.api_registration_profile.activation_key)
+        utils.activate_user(user.api_registration_profile.activation_key)
+
+        counters = metrics.registry.counters
+        for name in ('register', 'register.validate', 'create_inactive_user',
+                     'create_inactive_user.user_insert', 'create_profile',
+                     'send_activation_email.render', 'send_activation_email.send'):
+            self.assertEqual(counters[name, 'success'], 1, name)
+        self.assertEqual(counters['activate_user', 'success'], 1)
+        self.assertEqual(counters['activate_user', 'failure'], 1)
+
+    def test_register_failure(self):
+        get_user_model().objects.create(**VALID_DATA)
+
+        self.client.post(reverse('registration_api_register'), VALID_DATA)
+
+        counters = metrics.registry.counters
+        self.assertEqual(counters['register', 'failure'], 1)
+        self.assertEqual(counters['register.validate', 'failure'], 1)
+        self.assertNotIn(('register', 'success'), counters)
+
+    def test_render_prometheus(self):
+        metrics.registry.incr('register')
+        metrics.registry.timing('register', 0.5)
+
+        self.assertEqual(metrics.registry.render_prometheus(), (
+            '# TYPE registration_api_calls_total counter\n'
+            'registration_api_calls_total{operation="register",outcome="success"} 1\n'
+            '# TYPE registration_api_duration_seconds summary\n'
+            'registration_api_duration_seconds_count{operation="register"} 1\n'
+            'registration_api_duration_seconds_sum{operation="register"} 0.500000\n'))
+
+    def test_metrics_view(self):
+        metrics.registry.incr('register')
+
+        response = metrics_view(MockHttpRequest())
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('registration_api_calls_total', response.content)
+
+    @override_settings(REGISTRATION_API_METRICS_SINKS=['registration_api.metrics.StatsdSink'],
+                       REGISTRATION_API_STATSD_PREFIX='signup')
+    def test_statsd_sink(self):
+        sink = metrics.registry.sinks[0]
+        self.assertIsInstance(sink, metrics.StatsdSink)
+
+        with mock.patch.object(sink, 'socket') as mock_socket:
+            metrics.registry.incr('register')
+            metrics.registry.timing('register', 0.25)
+
+        self.assertEqual(mock_socket.sendto.call_args_list, [
+            mock.call(b'signup.register.success:1|c', ('localhost', 8125)),
+            mock.call(b'signup.register:250|ms', ('localhost', 8125)),
+        ])
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_paths(self):
+        return sorted(os.path.join(self.directory, filename)
+                      for filename in os.listdir(self.directory))
+
+    def test_disabled(self):
+        with override_settings(REGISTRATION_API_PROFILE_DIR=self.directory):
+            self.client.get(reverse('registration_activate', args=['0' * 40]))
+
+        self.assertEqual(self.get_paths(), [])
+
+    def test_sample(self):
+        with override_settings(REGISTRATION_API_PROFILE_DIR=self.directory,
+                               REGISTRATION_API_PROFILE_SAMPLE_RATE=1):
+            self.client.get(reverse('registration_activate', args=['0' * 40]))
+
+        path, = self.get_paths()
+        self.assertTrue(os.path.basename(path).startswith('activate-'))
+        self.assertTrue(path.endswith('.pstats'))
+        self.assertTrue(pstats.Stats(path).total_calls)
+
+    def test_slow_threshold(self):
+        def slow_view():
+            time.sleep(0.05)
+
+        with override_settings(REGISTRATION_API_PROFILE_DIR=self.directory,
+                               REGISTRATION_API_PROFILE_SLOW_THRESHOLD=0.01,
+                               REGISTRATION_API_PROFILE_INTERVAL=0.001):
+            profiling.profiled('slow')(slow_view)()
+            profiling.profiled('fast')(lambda: None)()
+
+        path, = self.get_paths()
+        self.assertTrue(path.endswith('.collapsed'))
+        with open(path) as f:
+            self.assertIn('slow_view', f.read())
+
+    def test_rotation(self):
+        with override_settings(REGISTRATION_API_PROFILE_DIR=self.directory,
+                               REGISTRATION_API_PROFILE_SAMPLE_RATE=1,
+                               REGISTRATION_API_PROFILE_KEEP=2):
+            view = profiling.profiled('view')(lambda: None)
+            for i in range(3):
+                view()
+                time.sleep(0.01)
+
+        self.assertEqual(len(self.get_paths()), 2)
@@ -0,0 +1,107 @@
+import hashlib
+
+from django.utils import six
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from .app_settings import app_settings
+
+
+class CacheBucketThrottle(SimpleRateThrottle):
+    """
+    Allow ``num_requests`` requests per ``duration`` for each client.
+
+    Every client gets a bucket in Django's cache holding the number of
+    requests made in the current period, emptied when the period ends.
+    The bucket is only touched with ``cache.add`` and ``cache.incr``,
+    which are atomic, so concurrent requests are counted exactly and a
+    check costs a single cache round trip.
+
+    Rates are read from ``REGISTRATION_API_THROTTLE_RATES`` by
+    ``scope``; a rate of ``None`` disables the throttle.
+
+    """
+    cache_format = 'registration_api:throttle:%(scope)s:%(ident)s:%(period)d'
+
+    def get_rate(self):
+        return app_settings.THROTTLE_RATES.get(self.scope)
+
+    def get_ident(self, request):
+        """
+        Return the client identity the requests are counted for, or
+        ``None`` not to throttle ``request``.
+
+        """
+        raise NotImplementedError('.get_ident() must be overridden')
+
+    def get_cache_key(self, request, view):
+        ident = self.get_ident(request)
+        if ident is None:
+            return None
+        self.period = int(self.now // self.duration)
+        # Hashed, so any identity is a valid cache key.
+        ident = hashlib.md5(ident.encode('utf-8')).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident,
+                                    'period': self.period}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.now = self.timer()
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        if self.cache.add(key, 1, self.duration):
+            count = 1
+        else:
+            try:
+                count = self.cache.incr(key)
+            except ValueError:
+                # The bucket expired between add() and incr().
+                self.cache.add(key, 1, self.duration)
+                count = 1
+        return count <= self.num_requests
+
+    def wait(self):
+        return (self.period + 1) * self.duration - self.now
+
+
+class IPThrottle(CacheBucketThrottle):
+    """
+    Count the requests per client address. Behind
+    ``REGISTRATION_API_THROTTLE_PROXY_COUNT`` trusted proxies, the
+    address is the one the outermost proxy added to the
+    ``REGISTRATION_API_THROTTLE_IP_HEADER`` list (``X-Forwarded-For``);
+    the addresses before it may be forged by the client.
+
+    """
+    def get_ident(self, request):
+        proxy_count = app_settings.THROTTLE_PROXY_COUNT
+        if proxy_count:
+            addresses = [address.strip() for address in
+                         request.META.get(app_settings.THROTTLE_IP_HEADER, '').split(',')
+                         if address.strip()]
+            if addresses:
+                return addresses[-min(proxy_count, len(addresses))]
+        return request.META.get('REMOTE_ADDR')
+
+
+class EmailThrottle(CacheBucketThrottle):
+
+    def get_ident(self, request):
+        email = request.DATA.get('email') if hasattr(request.DATA, 'get') else None
+        if not email or not isinstance(email, six.string_types):
+            return None
+        return email.strip().lower()
+
+
+class RegisterIPThrottle(IPThrottle):
+    scope = 'register_ip'
+
+
+class RegisterEmailThrottle(EmailThrottle):
+    scope = 'register_email'
+
+
+class ActivateIPThrottle(IPThrottle):
+    scope = 'activate_ip'
@@ -6,6 +6,12 @@ urlpatterns = patterns(
     url(r'^register/$',
         'registration_api.views.register',
         name='registration_api_register'),
+    url(r'^register/bulk/$',
+        'registration_api.views.register_bulk',
+        name='registration_api_register_bulk'),
+    url(r'^stats/$',
+        'registration_api.views.stats',
+        name='registration_api_stats'),
     url(r'^activate/(?P<activation_key>\w+)/$',
         'registration_api.views.activate',
         name='registration_activate'),
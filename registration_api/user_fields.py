@@ -0,0 +1,19 @@
+# Registration field metadata, per user model.
+_registration_fields = {}
+
+
+def get_registration_fields(user_model):
+    """
+    Return the user model fields a registration is made of, the
+    ``USERNAME_FIELD`` and ``email`` (when the model has one), as a list
+    of ``(name, model_field)`` tuples. Computed once per user model.
+
+    """
+    if user_model not in _registration_fields:
+        names = [user_model.USERNAME_FIELD]
+        if user_model.USERNAME_FIELD != 'email':
+            names.append('email')
+        model_fields = dict((f.name, f) for f in user_model._meta.fields)
+        _registration_fields[user_model] = [
+            (name, model_fields[name]) for name in names if name in model_fields]
+    return _registration_fields[user_model]
@@ -1,16 +1,38 @@
-import hashlib
-import random
+import datetime
 import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from multiprocessing.pool import Pool, ThreadPool
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.contrib.sites.models import Site
+from django.core.cache import cache
 from django.core.exceptions import ImproperlyConfigured
-from django.template.loader import render_to_string
-
-from .models import RegistrationProfile
-
-from django.db import transaction
+from django.core.mail import EmailMessage, get_connection
+from django.db import router
+from django.dispatch import receiver
+from django.template import Context
+from django.template.loader import get_template
+from django.test.signals import setting_changed
+from django.utils.baseconv import base62
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.functional import lazy
+from django.utils import timezone
+from django.utils.timezone import now as datetime_now
+
+from . import metrics
+from .bloom import user_filter
+from .export import get_user_values, iter_chunks
+from .keys import HEX_KEY_RE as SHA1_RE, compact_key, get_key_generator
+from .app_settings import DEFAULTS, PREFIX, app_settings
+from .models import (ActivationEmail, PendingRegistration, RegistrationProfile,
+                     RegistrationStats)
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
 # django 1.6, 1.5 and 1.4 supports
 try:
     atomic_decorator = transaction.atomic
@@ -18,74 +40,376 @@ except AttributeError:
     atomic_decorator = transaction.commit_on_success
 
 
-SHA1_RE = re.compile('^[a-f0-9]{40}$')
-DEFAULT_SETTINGS = {
-    'REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS': 7,
-}
+def get_user_database():
+    """Return the database alias users are written to."""
+    return router.db_for_write(get_user_model())
+
+
+def get_read_database():
+    """Return the database alias activation keys are looked up on."""
+    return app_settings.READ_DATABASE or app_settings.DATABASE
+
+
+@contextmanager
+def write_transaction():
+    """
+    Run the block in a transaction on the users database and, when the
+    registration tables are on another one (``REGISTRATION_API_DATABASE``),
+    in a transaction on that database too. The two are committed one
+    after the other, not atomically.
+
+    """
+    user_database = get_user_database()
+    with atomic_decorator(using=user_database):
+        if app_settings.DATABASE == user_database:
+            yield
+        else:
+            with atomic_decorator(using=app_settings.DATABASE):
+                yield
+
+
+SIGNED_KEY_RE = re.compile('^([0-9A-Za-z]+_[0-9A-Za-z]+)_([a-f0-9]{24})$')
+SIGNED_KEY_SALT = 'registration_api.utils.create_signed_activation_key'
+ACTIVATION_FAILURE_CACHE_FORMAT = 'registration_api:activation_failure:%s'
+# Kept for backwards compatibility, see ``app_settings.SETTINGS``.
+DEFAULT_SETTINGS = dict((PREFIX + name, default)
+                        for name, default in DEFAULTS.items()
+                        if default is not None)
+ACTIVATION_EMAIL_SUBJECT_TEMPLATE = 'registration_api/activation_email_subject.txt'
+ACTIVATION_EMAIL_TEMPLATE = 'registration_api/activation_email.txt'
+_templates = {}
+PASSWORD_HASHING_POOLS = {'thread': ThreadPool, 'process': Pool}
+_password_hashing_pools = {}
 
 
 def get_settings(key):
-    setting = getattr(settings, key, DEFAULT_SETTINGS.get(key, None))
-    if setting is None:
-        raise ImproperlyConfigured("The %s setting must not be empty." % key)
-    return setting
+    return app_settings.get(key)
 
 
-USER_CREATED_RESPONSE_DATA = {
-    'activation_days': get_settings('REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS')
-    }
+def get_user_created_response_data():
+    return {'activation_days': app_settings.ACCOUNT_ACTIVATION_DAYS}
+
+
+# Kept for backwards compatibility, use get_user_created_response_data().
+USER_CREATED_RESPONSE_DATA = lazy(get_user_created_response_data, dict)()
+
+# Field names, per user model.
+_valid_user_fields = {}
 
 
 def get_valid_user_fields():
-    fields = []
-    for f in get_user_model()._meta.fields:
-        fields.append(f.name)
-    return fields
+    """Return the field names of the user model, computed once per model."""
+    user_model = get_user_model()
+    if user_model not in _valid_user_fields:
+        _valid_user_fields[user_model] = [f.name for f in user_model._meta.fields]
+    return _valid_user_fields[user_model]
 
 
-VALID_USER_FIELDS = get_valid_user_fields()
+# Kept for backwards compatibility, use get_valid_user_fields(). Built on
+# first use, importing this module does not load the user model.
+VALID_USER_FIELDS = lazy(get_valid_user_fields, list)()
 
 
 def get_user_data(data):
+    valid_user_fields = get_valid_user_fields()
     user_data = {}
     for field, data in data.items():
-        if field in VALID_USER_FIELDS:
+        if field in valid_user_fields:
             user_data.update({field: data})
     return user_data
 
 
-@atomic_decorator
-def create_inactive_user(username=None, email=None, password=None):
+def get_password_hashing_pool():
+    """
+    Return the pool configured by ``REGISTRATION_API_PASSWORD_HASHING_POOL``
+    (``'thread'`` or ``'process'``) with
+    ``REGISTRATION_API_PASSWORD_HASHING_WORKERS`` workers, or ``None``
+    to hash in the calling thread. Pools are created once per process.
+
+    """
+    kind = app_settings.PASSWORD_HASHING_POOL
+    if not kind:
+        return None
+    if kind not in PASSWORD_HASHING_POOLS:
+        raise ImproperlyConfigured(
+            "REGISTRATION_API_PASSWORD_HASHING_POOL must be one of %s." %
+            ', '.join(sorted(PASSWORD_HASHING_POOLS)))
+    workers = app_settings.PASSWORD_HASHING_WORKERS
+    if (kind, workers) not in _password_hashing_pools:
+        _password_hashing_pools[kind, workers] = PASSWORD_HASHING_POOLS[kind](workers)
+    return _password_hashing_pools[kind, workers]
+
+
+def hash_passwords(passwords):
+    """
+    Hash each of ``passwords`` with ``make_password``, on the password
+    hashing pool if one is configured.
+
+    """
+    pool = get_password_hashing_pool()
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return pool.map(make_password, passwords)
+
+
+def hash_password(password):
+    return hash_passwords([password])[0]
+
+
+def build_inactive_user(username, email, hashed_password):
+    """
+    Return a new, unsaved and inactive user. ``username`` is ``None``
+    for user models using the email as their username.
+
+    """
     user_model = get_user_model()
+    new_user = user_model(email=user_model.objects.normalize_email(email),
+                          password=hashed_password, is_active=False)
     if username is not None:
-        new_user = user_model.objects.create_user(username, email, password)
-    else:
-        new_user = user_model.objects.create_user(email=email, password=password)
-    new_user.is_active = False
-    new_user.save()
-    create_profile(new_user)
-    site = Site.objects.get_current()
-    send_activation_email(new_user, site)
+        setattr(new_user, user_model.USERNAME_FIELD, username)
     return new_user
 
 
+@metrics.timed('create_inactive_user')
+def create_inactive_user(username=None, email=None, password=None):
+    """
+    Create an inactive user, its ``RegistrationProfile`` and send (or
+    queue) the activation email. The data is expected to be validated
+    already, so the password is only hashed for registrations that can
+    succeed.
+
+    The user is built with its password hashed and ``is_active`` unset
+    and saved with a single ``INSERT``; the manager's ``create_user`` is
+    not called. Without the email outbox a registration writes two
+    rows, the user and its profile, whatever ``AUTH_USER_MODEL`` is.
+
+    With ``REGISTRATION_API_DEFER_USER_CREATION`` only a
+    ``PendingRegistration`` is written and the returned user is left
+    unsaved; ``activate_user`` creates it.
+
+    The statistics are counted once the registration is committed, so
+    concurrent registrations do not wait on the lock of the day's row.
+
+    """
+    with metrics.timer('create_inactive_user.hash_password'):
+        hashed_password = hash_password(password)
+    new_user = build_inactive_user(username, email, hashed_password)
+    with write_transaction():
+        if app_settings.DEFER_USER_CREATION:
+            registration = stage_registration(new_user)
+            if app_settings.USE_EMAIL_OUTBOX:
+                queue_activation_email(new_user, registration.get_activation_key())
+            else:
+                site = Site.objects.get_current()
+                send_activation_email(new_user, site, registration.get_activation_key())
+        else:
+            with metrics.timer('create_inactive_user.user_insert'):
+                new_user.save(force_insert=True)
+            registration = create_profile(new_user)
+            if app_settings.USE_EMAIL_OUTBOX:
+                queue_activation_email(new_user)
+            else:
+                site = Site.objects.get_current()
+                send_activation_email(new_user, site)
+    if app_settings.TRACK_STATS:
+        record_registrations([registration])
+    return new_user
+
+
+def create_inactive_users(users_data, batch_size=500):
+    """
+    Create many inactive users at once, as ``create_inactive_user``
+    does for one. ``users_data`` is a sequence of dictionaries with
+    ``username`` (unless the user model uses the email as its
+    username), ``email`` and ``password`` keys.
+
+    Users and their ``RegistrationProfile`` are inserted with
+    ``bulk_create`` and the activation emails are either queued or sent
+    over a single mail connection. Returns the list of created users.
+    With ``REGISTRATION_API_DEFER_USER_CREATION`` the users are staged as
+    ``PendingRegistration`` rows and returned unsaved.
+
+    """
+    hashed_passwords = hash_passwords([data.get('password') for data in users_data])
+    new_users = [build_inactive_user(data.get('username'), data.get('email'),
+                                     hashed_password)
+                 for data, hashed_password in zip(users_data, hashed_passwords)]
+    with write_transaction():
+        new_users, registrations = insert_inactive_users(new_users, batch_size)
+        send_activation_emails(registrations, batch_size)
+    if app_settings.TRACK_STATS:
+        record_registrations(registrations)
+    return new_users
+
+
+def insert_inactive_users(new_users, batch_size):
+    """
+    Insert the unsaved ``new_users`` and their ``RegistrationProfile``
+    (or their ``PendingRegistration``), returning the users and the
+    registrations. Expired registrations holding the same usernames are
+    replaced.
+
+    """
+    if app_settings.DEFER_USER_CREATION:
+        registrations = [build_pending_registration(new_user) for new_user in new_users]
+        usernames = [registration.username for registration in registrations]
+        now = datetime_now()
+        for i in range(0, len(usernames), batch_size):
+            PendingRegistration.objects.filter(
+                username__in=usernames[i:i + batch_size], expires_at__lte=now).delete()
+        PendingRegistration.objects.bulk_create(registrations, batch_size=batch_size)
+        for new_user in new_users:
+            user_filter.add_user(new_user)
+        return new_users, registrations
+    user_model = get_user_model()
+    username_field = user_model.USERNAME_FIELD
+    user_model.objects.bulk_create(new_users, batch_size=batch_size)
+
+    # bulk_create does not set primary keys (nor send post_save), read
+    # them back.
+    usernames = [getattr(u, username_field) for u in new_users]
+    new_users = []
+    for i in range(0, len(usernames), batch_size):
+        new_users.extend(user_model.objects.filter(**{
+            '%s__in' % username_field: usernames[i:i + batch_size]}))
+    for new_user in new_users:
+        user_filter.add_user(new_user)
+
+    profiles = [RegistrationProfile(user=new_user,
+                                    **get_key_fields(create_activation_key(new_user)))
+                for new_user in new_users]
+    RegistrationProfile.objects.bulk_create(profiles, batch_size=batch_size)
+    for profile in profiles:
+        profile.email = profile.user.email
+    return new_users, profiles
+
+
+def send_activation_emails(registrations, batch_size):
+    """
+    Queue or send the activation emails of ``registrations`` (profiles
+    or ``PendingRegistration`` instances with an ``email`` attribute),
+    over a single mail connection.
+
+    """
+    if app_settings.USE_EMAIL_OUTBOX:
+        ActivationEmail.objects.bulk_create(
+            [ActivationEmail(email=r.email, activation_key=r.get_activation_key())
+             for r in registrations], batch_size=batch_size)
+    else:
+        site = Site.objects.get_current()
+        connection = get_connection()
+        emails = render_activation_emails(
+            [r.get_activation_key() for r in registrations], site)
+        messages = [EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL,
+                                 [registration.email], connection=connection)
+                    for registration, (subject, message) in zip(registrations, emails)]
+        connection.send_messages(messages)
+
+
+def build_pending_registration(user):
+    """
+    Return an unsaved ``PendingRegistration`` of the unsaved ``user``,
+    with a key from ``REGISTRATION_API_ACTIVATION_KEY_GENERATOR``. Signed
+    keys carry the user's primary key, they are never used here.
+
+    """
+    return PendingRegistration(
+        username=getattr(user, get_user_model().USERNAME_FIELD), email=user.email,
+        password=user.password, compact_key=compact_key(get_key_generator().generate(user)))
+
+
+@metrics.timed('stage_registration')
+def stage_registration(user):
+    """
+    Save a ``PendingRegistration`` of the unsaved ``user`` and return it.
+    An expired registration holding the same username is replaced.
+
+    """
+    pending = build_pending_registration(user)
+    try:
+        with atomic_decorator(using=app_settings.DATABASE):
+            pending.save(force_insert=True)
+    except IntegrityError:
+        expired = PendingRegistration.objects.filter(
+            username=pending.username, expires_at__lte=datetime_now())
+        if not expired.exists():
+            raise
+        expired.delete()
+        pending.save(force_insert=True)
+    user_filter.add_user(user)
+    return pending
+
+
+@metrics.timed('create_profile')
 def create_profile(user):
     activation_key = create_activation_key(user)
     registration_profile = RegistrationProfile.objects.create(
-        user=user, activation_key=activation_key)
+        user=user, **get_key_fields(activation_key))
     return registration_profile
 
 
+def get_key_fields(activation_key):
+    """
+    Return the ``RegistrationProfile`` fields storing ``activation_key``:
+    ``compact_key`` for hex keys with
+    ``REGISTRATION_API_COMPACT_ACTIVATION_KEYS``, ``activation_key``
+    otherwise.
+
+    """
+    if app_settings.COMPACT_ACTIVATION_KEYS and SHA1_RE.search(activation_key):
+        return {'activation_key': '', 'compact_key': compact_key(activation_key)}
+    return {'activation_key': activation_key}
+
+
 def create_activation_key(user):
-    username = getattr(user, user.USERNAME_FIELD)
-    salt_bytes = str(random.random()).encode('utf-8')
-    salt = hashlib.sha1(salt_bytes).hexdigest()[:5]
+    """
+    Return a new activation key for ``user``: a signed key with
+    ``REGISTRATION_API_ACTIVATION_KEY_MODE = 'signed'``, otherwise one
+    from ``REGISTRATION_API_ACTIVATION_KEY_GENERATOR``.
+
+    """
+    if app_settings.ACTIVATION_KEY_MODE == 'signed':
+        return create_signed_activation_key(user)
+    return get_key_generator().generate(user)
+
+
+def create_signed_activation_key(user):
+    """
+    Create an activation key that carries the user's primary key and
+    the time it was issued, signed with ``SECRET_KEY``. The key fits
+    the ``activation_key`` column and the ``\\w+`` URL pattern.
+
+    """
+    value = '%s_%s' % (base62.encode(user.pk), base62.encode(int(time.time())))
+    return '%s_%s' % (value, _activation_key_signature(value))
+
 
-    hash_input = (salt + username).encode('utf-8')
-    activation_key = hashlib.sha1(hash_input).hexdigest()
-    return activation_key
+def _activation_key_signature(value):
+    return salted_hmac(SIGNED_KEY_SALT, value).hexdigest()[:24]
 
 
+def check_signed_activation_key(activation_key):
+    """
+    Validate a key created by ``create_signed_activation_key`` without
+    touching the database. Return the user's primary key, or ``None``
+    if the key is malformed, tampered with or older than
+    ``REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS``.
+
+    """
+    match = SIGNED_KEY_RE.search(activation_key)
+    if match is None:
+        return None
+    value, signature = match.groups()
+    if not constant_time_compare(signature, _activation_key_signature(value)):
+        return None
+    user_pk, timestamp = [int(base62.decode(v)) for v in value.split('_')]
+    max_age = app_settings.ACCOUNT_ACTIVATION_DAYS * 86400
+    if time.time() - timestamp > max_age:
+        return None
+    return user_pk
+
+
+@metrics.timed('activate_user')
 def activate_user(activation_key):
     """
     Validate an activation key and activate the corresponding
@@ -96,31 +420,393 @@ def activate_user(activation_key):
     If the key is valid but the ``User`` is already active,
     return ``False``.
     To prevent reactivation of an account which has been
-    deactivated by site administrators, the activation key is
-    reset to the string constant ``RegistrationProfile.ACTIVATED``
-    after successful activation.
+    deactivated by site administrators, the profile ``state`` is set
+    to ``RegistrationProfile.ACTIVE`` after successful activation.
+
+    The state is changed with a conditional ``UPDATE``, so when the
+    same link is followed concurrently only one request activates the
+    user. Activation takes three queries: the profile lookup (joined to
+    the user) and one update each for the profile and the user. A key
+    found expired is marked ``RegistrationProfile.EXPIRED``.
+
+    The profile is looked up on ``REGISTRATION_API_READ_DATABASE``,
+    then on ``REGISTRATION_API_DATABASE`` if it was not replicated yet;
+    updates always go to the latter. When users are stored on another
+    database than the profiles, the user is read separately.
+
+    Signed keys (see ``create_signed_activation_key``) that are
+    tampered with or expired are rejected without a query.
+
+    With ``REGISTRATION_API_DEFER_USER_CREATION`` the key is first looked
+    up in the staged registrations, see ``activate_pending_registration``.
+
+    With ``REGISTRATION_API_ACTIVATION_FAILURE_CACHE_TTL`` keys that
+    failed (unknown, expired or already used) are remembered in the
+    cache for that many seconds and rejected without a query. Such a
+    failure is final, a key never becomes valid later.
 
     """
+    if SIGNED_KEY_RE.search(activation_key):
+        if check_signed_activation_key(activation_key) is None:
+            return False
     # Make sure the key we're trying conforms to the pattern of a
     # SHA1 hash; if it doesn't, no point trying to look it up in
     # the database.
-    if SHA1_RE.search(activation_key):
+    elif not SHA1_RE.search(activation_key):
+        return False
+    ttl = app_settings.ACTIVATION_FAILURE_CACHE_TTL
+    if not ttl:
+        return activate_registration(activation_key)
+    cache_key = ACTIVATION_FAILURE_CACHE_FORMAT % activation_key
+    if cache.get(cache_key):
+        metrics.registry.incr('activate_user.failure_cache', 'hit')
+        return False
+    metrics.registry.incr('activate_user.failure_cache', 'miss')
+    user = activate_registration(activation_key)
+    if user is False:
+        cache.set(cache_key, True, ttl)
+    return user
+
+
+def activate_registration(activation_key):
+    """
+    Activate the registration holding the well-formed ``activation_key``,
+    see ``activate_user``.
+
+    """
+    if app_settings.DEFER_USER_CREATION and SHA1_RE.search(activation_key):
+        user = activate_pending_registration(activation_key)
+        if user is not None:
+            return user
+    database = app_settings.DATABASE
+    user_database = get_user_database()
+    aliases = [get_read_database()]
+    if database not in aliases:
+        aliases.append(database)
+    profile = None
+    for alias in aliases:
+        profiles = RegistrationProfile.objects.db_manager(alias).for_key(activation_key)
+        if database == user_database:
+            profiles = profiles.select_related('user')
         try:
-            profile = RegistrationProfile.objects.get(
-                activation_key=activation_key)
+            profile = profiles.get()
         except RegistrationProfile.DoesNotExist:
+            continue
+        break
+    if profile is None:
+        return False
+    pending = RegistrationProfile.objects.using(database).filter(
+        pk=profile.pk, state=RegistrationProfile.PENDING)
+    if profile.activation_key_expired():
+        if profile.state == RegistrationProfile.PENDING:
+            pending.update(state=RegistrationProfile.EXPIRED)
+        return False
+    activated_at = datetime_now()
+    with write_transaction():
+        if not pending.update(state=RegistrationProfile.ACTIVE,
+                              activated_at=activated_at):
+            # Another request activated this key first.
             return False
-        if not profile.activation_key_expired():
-            user = profile.user
-            user.is_active = True
-            user.save()
-            profile.activation_key = RegistrationProfile.ACTIVATED
-            profile.save()
-            return user
-    return False
+        get_user_model().objects.filter(
+            pk=profile.user_id).update(is_active=True)
+    if app_settings.TRACK_STATS:
+        record_activation(activated_at, profile.expires_at)
+    if database == user_database:
+        user = profile.user
+        # Save it to the primary, though it may come from a replica.
+        user._state.db = user_database
+    else:
+        user = get_user_model()._default_manager.get(pk=profile.user_id)
+    user.is_active = True
+    return user
+
+
+def activate_pending_registration(activation_key):
+    """
+    Create the active user of the ``PendingRegistration`` holding
+    ``activation_key``, together with an activated ``RegistrationProfile``,
+    and delete the pending row. Return the user, ``False`` if the
+    registration expired or its username was taken meanwhile, and
+    ``None`` if no registration holds the key (it may belong to a
+    profile created before user creation was deferred).
+
+    It takes four queries: the lookup, the user and profile inserts and
+    the delete. The lookup is made on ``REGISTRATION_API_DATABASE``, a
+    replica would not know about the registration for long.
+
+    """
+    try:
+        pending = PendingRegistration.objects.get(compact_key=compact_key(activation_key))
+    except PendingRegistration.DoesNotExist:
+        return None
+    if pending.activation_key_expired():
+        return False
+    user = build_inactive_user(pending.username, pending.email, pending.password)
+    user.is_active = True
+    if hasattr(user, 'date_joined'):
+        user.date_joined = pending.created
+    activated_at = datetime_now()
+    with write_transaction():
+        try:
+            with atomic_decorator(using=get_user_database()):
+                user.save(force_insert=True)
+        except IntegrityError:
+            # Activated by a concurrent request, or the username was
+            # registered without deferral since.
+            return False
+        RegistrationProfile.objects.create(
+            user=user, state=RegistrationProfile.ACTIVE, expires_at=pending.expires_at,
+            activated_at=activated_at)
+        pending.delete()
+    if app_settings.TRACK_STATS:
+        record_activation(activated_at, pending.expires_at)
+    return user
+
+
+def stats_date(value):
+    """Return the (local) date ``value`` is counted on."""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def incr_stats(date, **counts):
+    """
+    Add ``counts`` (for example ``registered=1``) to the
+    ``RegistrationStats`` of ``date`` with a single ``UPDATE``, creating
+    the day's row on its first use.
+
+    """
+    updates = dict((name, F(name) + count) for name, count in counts.items())
+    stats = RegistrationStats.objects.filter(date=date)
+    if stats.update(**updates):
+        return
+    try:
+        # In a savepoint, a row created concurrently must not break the
+        # caller's transaction.
+        with atomic_decorator(using=app_settings.DATABASE):
+            RegistrationStats.objects.create(date=date, **counts)
+    except IntegrityError:
+        stats.update(**updates)
+
+
+def record_registrations(profiles):
+    """
+    Count new ``profiles`` as registered today and as expiring on their
+    ``expires_at`` date, until activated. Called once the registrations
+    are committed, in a short transaction of its own.
+
+    """
+    expiring = Counter(stats_date(profile.expires_at) for profile in profiles)
+    with atomic_decorator(using=app_settings.DATABASE):
+        incr_stats(stats_date(datetime_now()), registered=len(profiles))
+        for date, count in expiring.items():
+            incr_stats(date, expired=count)
+
+
+def record_activation(activated_at, expires_at):
+    """
+    Count an activation on ``activated_at``, no longer expiring on
+    ``expires_at``. Called once the activation is committed.
+
+    """
+    with atomic_decorator(using=app_settings.DATABASE):
+        incr_stats(stats_date(activated_at), activated=1)
+        incr_stats(stats_date(expires_at), expired=-1)
+
+
+def get_stats_data(stats):
+    """Return the counters of a ``RegistrationStats`` and its activation rate."""
+    return {
+        'date': stats.date,
+        'registered': stats.registered,
+        'activated': stats.activated,
+        'expired': stats.expired,
+        'activation_rate': (round(float(stats.activated) / stats.registered, 4)
+                            if stats.registered else None),
+    }
+
+
+def rebuild_stats(chunk_size=1000):
+    """
+    Recompute every ``RegistrationStats`` row from the registrations in
+    the database, reading them in a single pass. Users deleted since
+    they registered (see ``purge_expired_registrations``) are lost.
+
+    """
+    stats = {}
+
+    def count(date, name):
+        stats.setdefault(date, Counter())[name] += 1
+
+    lookups = ('pk', 'user_id', 'state', 'expires_at', 'activated_at')
+    for rows in iter_chunks(RegistrationProfile.objects.all(), lookups, chunk_size):
+        users = get_user_values([row[1] for row in rows], ['date_joined'])
+        for pk, user_id, state, expires_at, activated_at in rows:
+            if user_id in users:
+                count(stats_date(users[user_id][0]), 'registered')
+            if state == RegistrationProfile.ACTIVE:
+                if activated_at is not None:
+                    count(stats_date(activated_at), 'activated')
+            else:
+                count(stats_date(expires_at), 'expired')
+    lookups = ('pk', 'created', 'expires_at')
+    for rows in iter_chunks(PendingRegistration.objects.all(), lookups, chunk_size):
+        for pk, created, expires_at in rows:
+            count(stats_date(created), 'registered')
+            count(stats_date(expires_at), 'expired')
+    with atomic_decorator(using=app_settings.DATABASE):
+        RegistrationStats.objects.all().delete()
+        RegistrationStats.objects.bulk_create(
+            [RegistrationStats(date=date, **counts) for date, counts in stats.items()])
+    return len(stats)
+
+
+def purge_expired_registrations(batch_size=1000):
+    """
+    Delete the users whose registration expired before they activated
+    their account, together with their ``RegistrationProfile``, then the
+    expired ``PendingRegistration`` rows.
+
+    Users are deleted in batches of at most ``batch_size``, each in its
+    own short transaction. This is a generator yielding the number of
+    registrations deleted by each batch. Users activated without their
+    key (by an administrator) are kept and their profile is marked
+    ``RegistrationProfile.ACTIVE``.
+
+    """
+    user_model = get_user_model()
+    profiles = RegistrationProfile.objects
+    for count in purge_expired_pending_registrations(batch_size):
+        yield count
+    while True:
+        user_ids = list(profiles.expired().values_list(
+            'user_id', flat=True)[:batch_size])
+        if not user_ids:
+            break
+        with write_transaction():
+            # Filter again so a user activated since the ids were read
+            # is left alone. Profiles and users are not joined, they may
+            # be stored on different databases.
+            expired_ids = list(profiles.expired().filter(
+                user_id__in=user_ids).values_list('user_id', flat=True))
+            deleted_ids = list(user_model.objects.filter(
+                pk__in=expired_ids, is_active=False).values_list('pk', flat=True))
+            active_ids = set(expired_ids) - set(deleted_ids)
+            if active_ids:
+                # Leave the expired range, or they would be read again
+                # by every batch.
+                profiles.filter(user_id__in=list(active_ids)).update(
+                    state=RegistrationProfile.ACTIVE)
+            profiles.filter(user_id__in=deleted_ids).delete()
+            user_model.objects.filter(pk__in=deleted_ids).delete()
+        yield len(deleted_ids)
+        if len(user_ids) < batch_size:
+            break
+
+
+def count_expired_registrations(chunk_size=1000):
+    """
+    Return the number of registrations ``purge_expired_registrations``
+    would delete.
+
+    """
+    count = PendingRegistration.objects.filter(expires_at__lte=datetime_now()).count()
+    for rows in iter_chunks(RegistrationProfile.objects.expired(), ('pk', 'user_id'),
+                            chunk_size):
+        users = get_user_values([row[1] for row in rows], ['is_active'])
+        count += sum(1 for pk, user_id in rows
+                     if user_id in users and not users[user_id][0])
+    return count
+
+
+def purge_expired_pending_registrations(batch_size=1000):
+    pending = PendingRegistration.objects
+    while True:
+        ids = list(pending.filter(expires_at__lte=datetime_now()).values_list(
+            'pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        pending.filter(pk__in=ids).delete()
+        yield len(ids)
+        if len(ids) < batch_size:
+            break
+
+
+def get_purgeable_activation_emails():
+    """
+    Return the outbox emails already sent, or whose activation key
+    expired before they could be sent.
+
+    """
+    cutoff = datetime_now() - datetime.timedelta(
+        days=app_settings.ACCOUNT_ACTIVATION_DAYS)
+    return ActivationEmail.objects.filter(
+        Q(sent__isnull=False) | Q(created__lte=cutoff))
 
 
-def send_activation_email(user, site):
+def purge_activation_emails(batch_size=1000):
+    """
+    Delete the outbox emails returned by
+    ``get_purgeable_activation_emails``, so the outbox does not keep
+    every activation key. This is a generator yielding the number of
+    emails deleted by each batch.
+
+    """
+    while True:
+        ids = list(get_purgeable_activation_emails().values_list(
+            'pk', flat=True)[:batch_size])
+        if not ids:
+            break
+        ActivationEmail.objects.filter(pk__in=ids).delete()
+        yield len(ids)
+        if len(ids) < batch_size:
+            break
+
+
+def stage_pending_registrations(batch_size=1000):
+    """
+    Move the registrations waiting for activation out of the user
+    table, for ``REGISTRATION_API_DEFER_USER_CREATION``: every pending
+    ``RegistrationProfile`` of an inactive user becomes a
+    ``PendingRegistration`` with the same key and expiry, and the
+    profile and the user are deleted. Profiles with a signed key are
+    left alone, the key names the user's primary key.
+
+    This is a generator yielding the number of registrations moved by
+    each batch of at most ``batch_size``.
+
+    """
+    user_model = get_user_model()
+    names = [user_model.USERNAME_FIELD, 'email', 'password', 'is_active']
+    lookups = ('pk', 'user_id', 'activation_key', 'compact_key', 'expires_at')
+    profiles = RegistrationProfile.objects
+    for rows in iter_chunks(profiles.pending(), lookups, batch_size):
+        users = get_user_values([row[1] for row in rows], names)
+        staged = {}
+        for pk, user_id, activation_key, compact, expires_at in rows:
+            values = users.get(user_id)
+            if values is None or values[3]:
+                continue
+            if not compact:
+                if not SHA1_RE.search(activation_key):
+                    continue
+                compact = compact_key(activation_key)
+            staged[pk] = (user_id, PendingRegistration(
+                username=values[0], email=values[1], password=values[2],
+                compact_key=compact, expires_at=expires_at))
+        with write_transaction():
+            # Leave the profiles activated since they were read.
+            pks = list(profiles.pending().filter(pk__in=list(staged)).values_list(
+                'pk', flat=True))
+            PendingRegistration.objects.bulk_create([staged[pk][1] for pk in pks])
+            profiles.filter(pk__in=pks).delete()
+            user_model.objects.filter(pk__in=[staged[pk][0] for pk in pks],
+                                      is_active=False).delete()
+        yield len(pks)
+
+
+def send_activation_email(user, site, activation_key=None):
     """
     Send an activation email to the ``user``.
     The activation email will make use of two templates:
@@ -155,14 +841,137 @@ def send_activation_email(user, site):
     not). Consult the documentation for the Django sites
     framework for details regarding these objects' interfaces.
 
+    ``activation_key`` defaults to the key of the user's profile.
+
+    """
+    if activation_key is None:
+        activation_key = user.api_registration_profile.get_activation_key()
+    with metrics.timer('send_activation_email.render'):
+        subject, message = render_activation_email(activation_key, site)
+    with metrics.timer('send_activation_email.send'):
+        user.email_user(subject, message, settings.DEFAULT_FROM_EMAIL)
+
+
+def render_activation_email(activation_key, site):
+    """
+    Render the subject and body of an activation email, returning
+    them as a ``(subject, message)`` tuple.
+
+    """
+    return render_activation_emails([activation_key], site)[0]
+
+
+def render_activation_emails(activation_keys, site):
+    """
+    Render the activation emails for many ``activation_keys`` in one
+    pass, reusing the compiled templates and a single context. Returns
+    a list of ``(subject, message)`` tuples.
+
+    """
+    subject_template = get_cached_template(ACTIVATION_EMAIL_SUBJECT_TEMPLATE)
+    message_template = get_cached_template(ACTIVATION_EMAIL_TEMPLATE)
+    context = Context({
+        'expiration_days': app_settings.ACCOUNT_ACTIVATION_DAYS,
+        'site': site})
+    emails = []
+    for activation_key in activation_keys:
+        context.push()
+        context['activation_key'] = activation_key
+        # Email subject *must not* contain newlines
+        subject = ''.join(subject_template.render(context).splitlines())
+        message = message_template.render(context)
+        context.pop()
+        emails.append((subject, message))
+    return emails
+
+
+def get_cached_template(template_name):
+    """
+    Load and compile ``template_name`` once per process. With ``DEBUG``
+    enabled the template is loaded on every call, so changes to it are
+    picked up without a restart.
+
+    """
+    if settings.DEBUG:
+        return get_template(template_name)
+    if template_name not in _templates:
+        _templates[template_name] = get_template(template_name)
+    return _templates[template_name]
+
+
+@receiver(setting_changed)
+def clear_cached_templates(**kwargs):
+    if kwargs['setting'] in ('DEBUG', 'INSTALLED_APPS', 'TEMPLATE_DIRS',
+                             'TEMPLATE_LOADERS'):
+        _templates.clear()
+
+
+def queue_activation_email(user, activation_key=None):
+    """
+    Store the activation email for ``user`` in the outbox instead of
+    sending it, so the caller's transaction never waits on the mail
+    server. Queued emails are delivered by
+    ``send_queued_activation_emails``.
+
+    """
+    if activation_key is None:
+        activation_key = user.api_registration_profile.get_activation_key()
+    return ActivationEmail.objects.create(email=user.email, activation_key=activation_key)
+
+
+def send_queued_activation_emails(batch_size=100, connection=None):
+    """
+    Deliver up to ``batch_size`` due emails from the outbox over a
+    single mail connection, returning a ``(sent, failed)`` tuple.
+
+    Each email is claimed with a conditional update before it is sent,
+    so several workers can drain the outbox at once. A failed email is
+    retried with exponential backoff, starting at
+    ``REGISTRATION_API_EMAIL_OUTBOX_RETRY_DELAY`` seconds, until it
+    has been tried ``REGISTRATION_API_EMAIL_OUTBOX_MAX_ATTEMPTS``
+    times.
+
     """
-    ctx_dict = {'activation_key': user.api_registration_profile.activation_key,
-                'expiration_days': get_settings('REGISTRATION_API_ACCOUNT_ACTIVATION_DAYS'),
-                'site': site}
-    subject = render_to_string('registration_api/activation_email_subject.txt',
-                               ctx_dict)
-    # Email subject *must not* contain newlines
-    subject = ''.join(subject.splitlines())
-    message = render_to_string('registration_api/activation_email.txt',
-                               ctx_dict)
-    user.email_user(subject, message, settings.DEFAULT_FROM_EMAIL)
+    max_attempts = app_settings.EMAIL_OUTBOX_MAX_ATTEMPTS
+    retry_delay = app_settings.EMAIL_OUTBOX_RETRY_DELAY
+    now = datetime_now()
+    queued = list(ActivationEmail.objects.filter(
+        sent__isnull=True, next_attempt__lte=now,
+        attempts__lt=max_attempts)[:batch_size])
+    if not queued:
+        return 0, 0
+
+    emails = render_activation_emails([q.activation_key for q in queued],
+                                      Site.objects.get_current())
+    if connection is None:
+        connection = get_connection()
+    sent = failed = 0
+    connection.open()
+    try:
+        for queued_email, (subject, message) in zip(queued, emails):
+            # Claim the email by bumping its attempt counter; another
+            # worker that got there first makes this update a no-op.
+            delay = datetime.timedelta(
+                seconds=retry_delay * 2 ** queued_email.attempts)
+            claimed = ActivationEmail.objects.filter(
+                pk=queued_email.pk, attempts=queued_email.attempts,
+                sent__isnull=True).update(attempts=queued_email.attempts + 1,
+                                          next_attempt=now + delay)
+            if not claimed:
+                continue
+            email_message = EmailMessage(
+                subject, message, settings.DEFAULT_FROM_EMAIL,
+                [queued_email.email], connection=connection)
+            try:
+                email_message.send()
+            except Exception as e:
+                ActivationEmail.objects.filter(pk=queued_email.pk).update(
+                    last_error=repr(e))
+                failed += 1
+            else:
+                ActivationEmail.objects.filter(pk=queued_email.pk).update(
+                    sent=datetime_now(), last_error='')
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
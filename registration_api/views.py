@@ -1,38 +1,165 @@
-from django.http import HttpResponseRedirect
+import datetime
+import math
+import time
+
+from django.db import IntegrityError
+from django.db.models import Sum
+from django.http import HttpResponse, HttpResponseRedirect
+from django.utils.timezone import now as datetime_now
+from django.views.decorators.http import require_GET
 
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
 from rest_framework.response import Response
 
+import metrics
 import utils
-from serializers import UserSerializer
+from app_settings import app_settings
+from idempotency import idempotent
+from models import RegistrationStats
+from profiling import profiled
+from serializers import RegistrationSerializer, get_bulk_unique_errors
+from throttling import ActivateIPThrottle, RegisterEmailThrottle, RegisterIPThrottle
 
 
-VALID_USER_FIELDS = utils.get_valid_user_fields()
+ACTIVATE_THROTTLE_CLASSES = (ActivateIPThrottle, )
 
 
 @api_view(['POST'])
 @permission_classes((AllowAny, ))
+@throttle_classes((RegisterIPThrottle, RegisterEmailThrottle))
+@profiled('register')
+@idempotent('register')
+@metrics.timed('register')
 def register(request):
-    serialized = UserSerializer(data=request.POST)
-    if serialized.is_valid():
-        user_data = utils.get_user_data(request.POST)
-        utils.create_inactive_user(**user_data)
-        return Response(utils.USER_CREATED_RESPONSE_DATA,
+    serialized = RegistrationSerializer(data=request.DATA)
+    start = time.time()
+    is_valid = serialized.is_valid()
+    metrics.registry.timing('register.validate', time.time() - start)
+    metrics.registry.incr('register.validate', 'success' if is_valid else 'failure')
+    if is_valid:
+        try:
+            utils.create_inactive_user(**serialized.object)
+        except IntegrityError:
+            # Taken since it was validated, or not checked because the
+            # user filter of this process missed it.
+            errors = serialized.get_unique_errors(serialized.init_data)
+            if not errors:
+                raise
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(utils.get_user_created_response_data(),
                         status=status.HTTP_201_CREATED)
     else:
         return Response(serialized._errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes((IsAdminUser, ))
+def register_bulk(request):
+    """
+    Register a list of users in one request. Valid users are created
+    and the errors of the invalid ones are returned, keyed by their
+    position in the list.
+
+    """
+    if not isinstance(request.DATA, list):
+        return Response({'detail': 'Expected a list of users.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    errors = []
+    # Unique fields are checked for the whole list at once, in the
+    # database rather than the user filter: it may miss users created by
+    # other processes, and a duplicate would fail the whole batch.
+    context = {'check_unique': False}
+    valid = []
+    for index, data in enumerate(request.DATA):
+        serialized = RegistrationSerializer(data=data, context=context)
+        if not serialized.is_valid():
+            errors.append({'index': index, 'errors': serialized._errors})
+            continue
+        valid.append((index, serialized))
+    unique_errors = get_bulk_unique_errors([serialized.init_data for index, serialized in valid])
+    users_data = []
+    taken = []
+    for (index, serialized), row_errors in zip(valid, unique_errors):
+        if row_errors:
+            taken.append({'index': index, 'errors': row_errors})
+        else:
+            users_data.append(serialized.object)
+    try:
+        created = utils.create_inactive_users(users_data) if users_data else []
+    except IntegrityError:
+        # Registered concurrently since validated: nothing was created,
+        # report the rows taken meanwhile.
+        unique_errors = get_bulk_unique_errors(
+            [serialized.init_data for index, serialized in valid])
+        taken = [{'index': index, 'errors': row_errors}
+                 for (index, serialized), row_errors in zip(valid, unique_errors)
+                 if row_errors]
+        if not taken:
+            raise
+        errors = sorted(errors + taken, key=lambda error: error['index'])
+        return Response({'created': 0, 'errors': errors},
+                        status=status.HTTP_400_BAD_REQUEST)
+    errors = sorted(errors + taken, key=lambda error: error['index'])
+    data = {'created': len(created), 'errors': errors}
+    if errors and not created:
+        return Response(data, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+@profiled('activate')
 def activate(request, activation_key=None):
     """
     Given an an activation key, look up and activate the user
     account corresponding to that key (if possible).
 
     """
+    for throttle in [throttle_class() for throttle_class in ACTIVATE_THROTTLE_CLASSES]:
+        if not throttle.allow_request(request, None):
+            response = HttpResponse(status=status.HTTP_429_TOO_MANY_REQUESTS)
+            response['Retry-After'] = '%d' % math.ceil(throttle.wait())
+            return response
     utils.activate_user(activation_key)
     # if not activated
-    success_url = utils.get_settings('REGISTRATION_API_ACTIVATION_SUCCESS_URL')
+    success_url = app_settings.get('ACTIVATION_SUCCESS_URL')
     if success_url is not None:
         return HttpResponseRedirect(success_url)
+
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser, ))
+def stats(request):
+    """
+    Return the registration counters of the last ``days`` days (30 by
+    default, 366 at most) and their totals, read from the daily
+    ``RegistrationStats`` rows.
+
+    """
+    try:
+        days = min(int(request.QUERY_PARAMS.get('days', 30)), 366)
+    except ValueError:
+        return Response({'detail': 'days must be an integer.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    today = utils.stats_date(datetime_now())
+    rows = RegistrationStats.objects.filter(
+        date__lte=today, date__gt=today - datetime.timedelta(days=days))
+    data = [utils.get_stats_data(row) for row in rows]
+    totals = RegistrationStats.objects.filter(date__lte=today).aggregate(
+        registered=Sum('registered'), activated=Sum('activated'),
+        expired=Sum('expired'))
+    totals = utils.get_stats_data(RegistrationStats(
+        **dict((name, value or 0) for name, value in totals.items())))
+    del totals['date']
+    return Response({'days': data, 'totals': totals})
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Expose the registration metrics in the Prometheus text format. Not
+    routed by ``registration_api.urls``, add it to your own urls.
+
+    """
+    return HttpResponse(metrics.registry.render_prometheus(),
+                        content_type='text/plain; version=0.0.4')
@@ -5,7 +5,27 @@ DIRNAME = os.path.dirname(__file__)
 DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3',
                          'NAME': os.path.join(DIRNAME, 'database.db'),
                          },
+             # Used by the tests of registration_api.routers.
+             'registration': {'ENGINE': 'django.db.backends.sqlite3',
+                              'NAME': os.path.join(DIRNAME, 'registration.db'),
+                              },
+             'replica': {'ENGINE': 'django.db.backends.sqlite3',
+                         'NAME': os.path.join(DIRNAME, 'replica.db'),
+                         },
              }
+
+
+class SyncAllRouter(object):
+    """
+    Create every table on every test database, the tests move the
+    registration tables between them with override_settings.
+
+    """
+    def allow_syncdb(self, db, model):
+        return True
+
+
+DATABASE_ROUTERS = [SyncAllRouter(), 'registration_api.routers.RegistrationRouter']
 DEBUG = True
 DATABASES = DATABASES
 INSTALLED_APPS = ('django.contrib.auth',